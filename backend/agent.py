@@ -1,38 +1,62 @@
 # backend/agent.py
 
 import os
+import copy
 import time
 import threading
 from flask import jsonify
 import google.generativeai as genai
-from .tools import tool_map, tool_config, read_file, write_file, record_learning, knowledge_base_path
+from .tools import tool_map, tool_config, read_file, write_file, record_learning, knowledge_store, DESTRUCTIVE_TOOLS, auto_checkpoint, project_root
+from .retrieval import ContextRetriever
+from .state import AgentState, AppendLog, SCRATCHPAD_WINDOW_CHARS, TOOL_LOG_WINDOW_CHARS
+from .routing import ModelRouter, load_routing_rules, ROUTER_FAST_MODEL
+from .toolcache import ToolResultCache
+
+RAG_AUTO_CONTEXT = os.environ.get("RAG_AUTO_CONTEXT", "1") == "1"
+TOOL_RESULT_CACHE = os.environ.get("TOOL_RESULT_CACHE", "1") == "1"
+# Tools after which the RAG index is refreshed before it is queried again.
+REINDEX_TOOLS = DESTRUCTIVE_TOOLS | {"create_directory", "rollback", "execute_git_command"}
+TOOL_LOG_OUTPUT_CHARS = 500
+scratchpad_archive_path = os.path.join(project_root, 'raw-conversations', 'scratchpad-archive.md')
 
 # --- Global State ---
 agent_thread = None
 stop_event = threading.Event()
-agent_state = {
-    "status": "stopped",
-    "main_plan": "",
-    "scratchpad": "",
-    "last_tool_output": "",
-    "history": [],
-    "requires_confirmation": False,
-    "confirmation_prompt": "",
-}
+agent_state = AgentState(
+    fields={
+        "status": "stopped",
+        "main_plan": "",
+        "last_tool_output": "",
+        "history": [],
+        "requires_confirmation": False,
+        "confirmation_prompt": "",
+        "rag_stats": {},
+        "routing_stats": {},
+        "tool_cache_stats": {},
+    },
+    logs={
+        "scratchpad": AppendLog(SCRATCHPAD_WINDOW_CHARS, archive_path=scratchpad_archive_path),
+        "tool_log": AppendLog(TOOL_LOG_WINDOW_CHARS),
+    },
+)
 confirmation_event = threading.Event()
 user_confirmation = None
 
 # --- Agent Core ---
 
-def get_base_prompt():
-    """Reads the base prompt and knowledge base."""
+def get_base_prompt(goal=None):
+    """Reads the base prompt and the learnings most relevant to the goal."""
     base_prompt = read_file("backend/base_prompt.md")
-    knowledge_base = read_file(knowledge_base_path)
+    try:
+        knowledge_base = knowledge_store.format_relevant(goal)
+    except Exception as e:
+        print(f"Could not load relevant learnings: {e}")
+        knowledge_base = ""
     return f"{base_prompt}\n\n<knowledge_base>\n{knowledge_base}\n</knowledge_base>"
 
-def get_tdd_prompt():
+def get_tdd_prompt(goal=None):
     """Returns the system prompt with TDD instructions."""
-    base_prompt = get_base_prompt()
+    base_prompt = get_base_prompt(goal)
     tdd_instructions = """
 You are now operating in a Test-Driven Development (TDD) workflow. Your primary goal is to ensure all new functionality is verified by tests *before* you write the implementation code.
 
@@ -51,7 +75,7 @@ Your workflow for any new feature or bug fix should be as follows:
 
 4.  **GREEN - Write Implementation Code:**
     *   Write the *minimum* amount of code necessary to make the failing test pass.
-    *   Use the `write_file` or `rename_file` tools to create or modify the application code.
+    *   Use `write_file` to create new files. To change an existing file, use `edit_files` or `apply_patch` instead of rewriting it.
 
 5.  **Confirm the Test Passes:**
     *   Use the `run_tests` tool again.
@@ -72,25 +96,44 @@ Always think: "What is the next test I need to write?"
 
 def update_agent_state(key, value):
     """Updates the agent's state."""
-    agent_state[key] = value
+    agent_state.set(key, value)
+
+def append_agent_log(key, text):
+    """Appends a segment to the scratchpad or tool log without copying what came before."""
+    agent_state.append(key, text)
+
+def rag_query():
+    """The retrieval query for the agent's current focus."""
+    return f"{agent_state['main_plan']}\n{agent_state['scratchpad'][-1000:]}"
 
-def run_agent_loop(model, goal, auto_approve_flag=False):
-    """The main loop for the autonomous agent."""
+def run_agent_loop(router, goal, auto_approve_flag=False):
+    """The main loop for the autonomous agent. `router` picks the model for each turn."""
     global auto_approve
     auto_approve = auto_approve_flag
 
     update_agent_state("status", "running")
 
     # Initialize history
-    system_prompt = get_tdd_prompt()
-    agent_state["history"] = [{"role": "user", "parts": [{"text": f"System Prompt: {system_prompt}\n\nUser Goal: {goal}"}]}]
+    system_prompt = get_tdd_prompt(goal)
+    update_agent_state("history", [{"role": "user", "parts": [{"text": f"System Prompt: {system_prompt}\n\nUser Goal: {goal}"}]}])
+
+    retriever = ContextRetriever() if RAG_AUTO_CONTEXT else None
+    tool_cache = ToolResultCache(project_root) if TOOL_RESULT_CACHE else None
+
+    if retriever:
+        retriever.refresh_index()
 
     while not stop_event.is_set():
         try:
+            # Usually already running: the previous turn submitted this query when it ended.
+            rag_context = retriever.collect(retriever.submit(rag_query()), agent_state["history"]) if retriever else ""
+            rag_section = f"Relevant Code (retrieved automatically):\n{rag_context}\n\n" if rag_context else ""
+
             # Construct the full prompt
             full_prompt = (
                 f"Main Plan:\n{agent_state['main_plan']}\n\n"
                 f"Scratchpad:\n{agent_state['scratchpad']}\n\n"
+                f"{rag_section}"
                 f"Last Tool Output:\n{agent_state['last_tool_output']}\n\n"
                 "Based on the plan, your scratchpad, and the last tool output, decide on the next single tool to use. "
                 "Think step-by-step in your scratchpad. Then, call the tool."
@@ -99,11 +142,12 @@ def run_agent_loop(model, goal, auto_approve_flag=False):
             # Add the current state to the history for the model
             current_conversation = agent_state["history"] + [{"role": "user", "parts": [{"text": full_prompt}]}]
 
-            response = model.generate_content(
+            response = router.generate(
                 current_conversation,
                 tools=[tool_config],
                 generation_config={"temperature": 0.1}
             )
+            update_agent_state("routing_stats", copy.deepcopy(router.stats))
 
             if not response.candidates or not response.candidates[0].content.parts:
                 update_agent_state("last_tool_output", "Error: Model generated an empty response.")
@@ -116,7 +160,8 @@ def run_agent_loop(model, goal, auto_approve_flag=False):
             if not tool_calls:
                 # Handle cases where the model generates text instead of a tool call
                 text_response = "".join([part.text for part in response.candidates[0].content.parts if part.text])
-                update_agent_state("scratchpad", agent_state["scratchpad"] + "\n" + text_response)
+                append_agent_log("scratchpad", text_response)
+                router.observe_text_response()
                 # No tool output to record
                 update_agent_state("last_tool_output", "Model generated text instead of a tool call. Continuing.")
                 agent_state["history"].append({"role": "model", "parts": [{"text": text_response}]})
@@ -129,30 +174,56 @@ def run_agent_loop(model, goal, auto_approve_flag=False):
                 for tool_call in tool_calls:
                     tool_name = tool_call.name
                     args = {key: value for key, value in tool_call.args.items()}
+                    if retriever:
+                        retriever.record_tool_call(tool_name, args)
 
                     if tool_name in tool_map:
                         try:
                             # Update scratchpad right before execution
                             thought_process = f"Executing tool: {tool_name} with args: {args}\n"
-                            update_agent_state("scratchpad", agent_state["scratchpad"] + "\n" + thought_process)
-
-                            output = tool_map[tool_name](**args)
+                            append_agent_log("scratchpad", thought_process)
+
+                            # A repeated read of an unchanged path gets a pointer to the earlier result
+                            output = tool_cache.lookup(tool_name, args) if tool_cache else None
+                            if output is None:
+                                checkpoint_note = None
+                                if tool_name in DESTRUCTIVE_TOOLS:
+                                    try:
+                                        checkpoint_note = auto_checkpoint(tool_name, args)
+                                    except Exception as e:
+                                        print(f"Automatic checkpoint failed: {e}")
+
+                                output = tool_map[tool_name](**args)
+                                if checkpoint_note:
+                                    output = f"{output}\n{checkpoint_note}"
+                                if retriever and tool_name in REINDEX_TOOLS:
+                                    retriever.refresh_index()
+                                if tool_cache:
+                                    tool_cache.record(tool_name, args, output)
                             tool_outputs.append({"tool_name": tool_name, "output": output})
 
                             # Update state immediately after
                             update_agent_state("last_tool_output", output)
+                            append_agent_log("tool_log", f"{tool_name}: {str(output)[:TOOL_LOG_OUTPUT_CHARS]}")
+                            router.observe_tool_result(tool_name, output)
 
                             # Handle confirmation requests
                             if agent_state["requires_confirmation"]:
                                 break
 
                         except Exception as e:
+                            if tool_cache:
+                                # The call may have changed files before failing.
+                                tool_cache.record(tool_name, args, None)
                             error_msg = f"Error executing tool {tool_name}: {e}"
                             tool_outputs.append({"tool_name": tool_name, "output": error_msg})
                             update_agent_state("last_tool_output", error_msg)
+                            append_agent_log("tool_log", f"{tool_name}: {error_msg}")
+                            router.observe_malformed_tool_call()
                     else:
                         tool_outputs.append({"tool_name": tool_name, "output": f"Tool '{tool_name}' not found."})
                         update_agent_state("last_tool_output", f"Tool '{tool_name}' not found.")
+                        router.observe_malformed_tool_call()
 
                 # Update history with model's turn and tool responses
                 agent_state["history"].append({"role": "model", "parts": response.candidates[0].content.parts})
@@ -166,6 +237,11 @@ def run_agent_loop(model, goal, auto_approve_flag=False):
                     })
                 agent_state["history"].append({"role": "user", "parts": [{"function_response": {"name": "tool_outputs", "responses": tool_response_parts}}]})
 
+            if retriever:
+                # Start the next turn's retrieval now, behind any index refresh queued above,
+                # so it runs while we wait for confirmation and the next turn is prepared.
+                retriever.submit(rag_query())
+
             # Check for confirmation again after processing
             if agent_state["requires_confirmation"]:
                 confirmation_event.wait() # Wait for user input
@@ -176,30 +252,45 @@ def run_agent_loop(model, goal, auto_approve_flag=False):
 
                 if user_confirmation == "deny":
                     update_agent_state("last_tool_output", "User denied the action. Please reconsider the plan.")
+                    router.request_planning()
                 else:
                     update_agent_state("last_tool_output", "User approved the action.")
 
                 update_agent_state("requires_confirmation", False)
 
+            if retriever:
+                update_agent_state("rag_stats", dict(retriever.stats))
+            if tool_cache:
+                update_agent_state("tool_cache_stats", dict(tool_cache.stats))
 
         except Exception as e:
             error_message = f"An error occurred in the agent loop: {e}"
             update_agent_state("last_tool_output", error_message)
             time.sleep(10) # Wait before retrying
 
+    if retriever:
+        retriever.shutdown()
     update_agent_state("status", "stopped")
 
 # --- Control Functions ---
 
-def start_agent_loop(model_name, goal, auto_approve_flag=False):
-    """Starts the agent loop in a background thread."""
+def start_agent_loop(model_name, goal, auto_approve_flag=False, fast_model_name=ROUTER_FAST_MODEL, routing_rules=None):
+    """
+    Starts the agent loop in a background thread. `model_name` is the strong model;
+    routine turns go to `fast_model_name`, as governed by `routing_rules`.
+    """
     global agent_thread, stop_event
     if agent_thread and agent_thread.is_alive():
         return "Agent is already running."
 
+    rules = load_routing_rules(routing_rules)
     stop_event.clear()
     genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel(model_name)
+    strong_model = genai.GenerativeModel(model_name)
+    fast_model = strong_model
+    if fast_model_name and fast_model_name.removeprefix("models/") != model_name.removeprefix("models/"):
+        fast_model = genai.GenerativeModel(fast_model_name)
+    router = ModelRouter(fast_model, strong_model, rules)
 
     # Reset state for new run
     agent_state.update({
@@ -209,9 +300,13 @@ def start_agent_loop(model_name, goal, auto_approve_flag=False):
         "history": [],
         "requires_confirmation": False,
         "confirmation_prompt": "",
+        "rag_stats": {},
+        "routing_stats": {},
+        "tool_cache_stats": {},
+        "tool_log": "",
     })
 
-    agent_thread = threading.Thread(target=run_agent_loop, args=(model, goal, auto_approve_flag))
+    agent_thread = threading.Thread(target=run_agent_loop, args=(router, goal, auto_approve_flag))
     agent_thread.start()
     return "Agent started successfully."
 
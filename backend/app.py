@@ -7,6 +7,9 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import json
 import datetime
+import atexit
+import time
+import threading
 import docker
 
 # --- Pathing and Initialization ---
@@ -48,6 +51,100 @@ except Exception as e:
 
 # --- Module Imports ---
 from .agent import start_agent_loop, stop_agent_loop, is_agent_running, get_agent_state, provide_confirmation, update_state_manually
+from .routing import ROUTER_FAST_MODEL
+from .tools import worker_pool
+from .gemma import reconstruct_history, stream_chat_response, serializable_history
+from .sessions import SessionStore, SessionVersionConflict, DEFAULT_MAX_SESSIONS, DEFAULT_MAX_BYTES
+from .streaming import StreamRegistry, buffered_stream
+from google.generativeai.protos import Part
+
+# --- Chat Session Store ---
+chat_sessions = SessionStore(
+    max_sessions=int(os.environ.get("CHAT_SESSION_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+    max_bytes=int(os.environ.get("CHAT_SESSION_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    persist_dir=os.environ.get("CHAT_SESSION_DIR"),
+    serialize=serializable_history,
+    deserialize=reconstruct_history,
+)
+stream_registry = StreamRegistry()
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 25))
+
+def shutdown(timeout=SHUTDOWN_DRAIN_TIMEOUT):
+    """Drains open chat streams, stops the agent thread, persists chat sessions and stops test workers."""
+    drained = stream_registry.drain(timeout)
+    if is_agent_running():
+        stop_agent_loop()
+    chat_sessions.flush()
+    worker_pool.shutdown()
+    return drained
+
+atexit.register(shutdown)
+
+# --- Chat Routes ---
+@app.route('/chat', methods=['POST'])
+def chat():
+    """
+    Streams a chat reply. Clients send only the new message plus their session id
+    and version; the full `conversation_history` is only needed to (re)sync a session.
+    """
+    data = request.get_json()
+    message = data.get('message')
+    model_name = data.get('model', 'gemini-1.5-flash')
+    session_id = data.get('session_id')
+    version = data.get('version')
+    if not message:
+        return jsonify({"error": "Message is required."}), 400
+    if stream_registry.shutting_down.is_set():
+        return jsonify({"error": "Server is shutting down."}), 503
+
+    session = chat_sessions.get(session_id) if session_id else None
+    if session is None or session.version != version:
+        conversation_history = data.get('conversation_history')
+        if conversation_history is not None:
+            # Rebuild once from the client's copy, then serve deltas from here on.
+            history = reconstruct_history(conversation_history)
+            session = chat_sessions.replace(session_id, history) if session_id else chat_sessions.create(history)
+        elif session_id is None:
+            session = chat_sessions.create()
+        else:
+            return jsonify({
+                "error": "Session is out of sync. Resend with conversation_history.",
+                "session_id": session_id,
+                "version": session.version if session else None,
+            }), 409
+
+    base_version = session.version
+    turns = [{"role": "user", "parts": [Part(text=message)]}]
+
+    def generate():
+        streamed = appended = False
+        # The live chat is stateful, so the session is held for the whole exchange; a
+        # concurrent request on it waits here and then finds its version stale.
+        with session.lock:
+            try:
+                if session.version != base_version:
+                    raise SessionVersionConflict(session.session_id, base_version, session.version)
+                if session.chat is None or session.model_name != model_name:
+                    session.chat = genai.GenerativeModel(model_name).start_chat(history=list(session.history))
+                    session.model_name = model_name
+                # stream_chat_response appends the model's reply to `turns`.
+                streamed = True
+                for event in stream_chat_response(session.chat, turns):
+                    yield event
+                new_version = chat_sessions.append(session.session_id, turns, base_version)
+                appended = True
+                yield f"data: {json.dumps({'session_id': session.session_id, 'version': new_version})}\n\n"
+            except (SessionVersionConflict, KeyError):
+                yield f"data: {json.dumps({'error': 'Session changed during the request.', 'session_id': session.session_id})}\n\n"
+            except Exception as e:
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            finally:
+                # Unless the turn was stored, the live chat may hold a partial turn (e.g. the
+                # client disconnected mid-stream); rebuild it from stored history next time.
+                if streamed and not appended:
+                    session.chat = None
+
+    return Response(buffered_stream(generate(), stream_registry), mimetype='text/event-stream')
 
 # --- Agent Routes ---
 @app.route('/execute_plan', methods=['POST'])
@@ -58,10 +155,14 @@ def execute_plan():
     data = request.get_json()
     goal = data.get('goal')
     model_name = data.get('model', 'gemini-1.5-flash')
+    fast_model_name = data.get('fast_model', ROUTER_FAST_MODEL)
     if not goal:
         return jsonify({"error": "Goal is required."}), 400
 
-    start_agent_loop(model_name, goal)
+    try:
+        start_agent_loop(model_name, goal, fast_model_name=fast_model_name, routing_rules=data.get('routing_rules'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"status": "Agent started."}), 202
 
 
@@ -74,17 +175,47 @@ def stop_agent():
     return jsonify({"status": "Agent stopped."})
 
 
+STATUS_KEYS = ["main_plan", "scratchpad", "tool_log", "status", "confirmation_prompt", "rag_stats", "routing_stats", "tool_cache_stats"]
+
 @app.route('/status', methods=['GET'])
 def get_status():
-    agent_status_info = get_agent_state()
-    return jsonify({
-        "main_plan": agent_status_info.get("main_plan"),
-        "scratchpad": agent_status_info.get("scratchpad"),
+    """
+    Returns the agent's state. With `?since=<version>`, the plan and other fields are
+    only included if they changed, and the scratchpad and tool log only carry the text
+    appended since that version (or their full text, with `reset`, if the client must
+    replace its copy).
+    """
+    agent_state = get_agent_state()
+    since = request.args.get('since', type=int)
+    if since is None:
+        snapshot = agent_state.snapshot(STATUS_KEYS)
+        return jsonify({
+            "version": snapshot["version"],
+            "main_plan": snapshot["main_plan"],
+            "scratchpad": snapshot["scratchpad"],
+            "tool_log": snapshot["tool_log"],
+            "agent_running": is_agent_running(),
+            "agent_status": snapshot["status"],
+            "confirmation_prompt": snapshot["confirmation_prompt"],
+            "auto_approve": auto_approve,
+            "rag_stats": snapshot["rag_stats"],
+            "routing_stats": snapshot["routing_stats"],
+            "tool_cache_stats": snapshot["tool_cache_stats"],
+        })
+
+    changes = agent_state.changes_since(since, STATUS_KEYS)
+    fields = changes["fields"]
+    response = {
+        "version": changes["version"],
+        "delta": True,
+        "logs": changes["logs"],
         "agent_running": is_agent_running(),
-        "agent_status": agent_status_info.get("status"),
-        "confirmation_prompt": agent_status_info.get("confirmation_prompt"),
-        "auto_approve": auto_approve
-    })
+        "auto_approve": auto_approve,
+    }
+    for key, response_key in [("main_plan", "main_plan"), ("status", "agent_status"), ("confirmation_prompt", "confirmation_prompt"), ("rag_stats", "rag_stats"), ("routing_stats", "routing_stats"), ("tool_cache_stats", "tool_cache_stats")]:
+        if key in fields:
+            response[response_key] = fields[key]
+    return jsonify(response)
 
 @app.route('/respond_to_confirmation', methods=['POST'])
 def handle_confirmation_response():
@@ -103,11 +234,20 @@ def toggle_auto_approve():
     return jsonify({"auto_approve": auto_approve})
 
 # --- Model Routes ---
+MODELS_CACHE_TTL = float(os.environ.get("MODELS_CACHE_TTL", 300))
+models_cache = {"models": None, "fetched_at": 0.0}
+models_cache_lock = threading.Lock()
+
 @app.route('/models', methods=['GET'])
 def get_models():
-    """Returns a list of available models."""
+    """Returns a list of available models, cached for MODELS_CACHE_TTL seconds."""
     try:
-        models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+        # Holding the lock while fetching stops concurrent misses from all hitting the API.
+        with models_cache_lock:
+            if models_cache["models"] is None or time.time() - models_cache["fetched_at"] > MODELS_CACHE_TTL:
+                models_cache["models"] = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+                models_cache["fetched_at"] = time.time()
+            models = models_cache["models"]
         return jsonify(models)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,232 @@
+# backend/checkpoints.py
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import difflib
+import threading
+
+# --- Workspace Checkpoints ---
+# Snapshots of the workspace are manifests that map each file to a content-addressed
+# object. Unchanged files share objects across snapshots, and a stat cache means a
+# checkpoint only hashes files that changed since the last scan. Rolling back only
+# touches files that differ from the snapshot.
+
+MAX_AUTO_CHECKPOINTS = int(os.environ.get("MAX_AUTO_CHECKPOINTS", 50))
+IGNORED_DIRS = {'.git', '__pycache__', '.pytest_cache', 'node_modules'}
+DIFF_MAX_LINES = 200
+
+
+class CheckpointStore:
+    """Content-addressed snapshots of a directory tree."""
+
+    def __init__(self, root, store_dir, max_auto=MAX_AUTO_CHECKPOINTS):
+        self.root = root
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, 'objects')
+        self.manifests_dir = os.path.join(store_dir, 'manifests')
+        self.index_path = os.path.join(store_dir, 'index.json')
+        self.max_auto = max_auto
+        self._lock = threading.RLock()
+        self._stat_cache = {}
+        self._manifests = {}
+        self._index = None
+
+    # --- Public API ---
+
+    def checkpoint(self, label="", auto=False, keep=()):
+        """
+        Snapshots the tree and returns the new checkpoint's id. Checkpoints listed in
+        `keep` are never pruned by this call.
+        """
+        with self._lock:
+            files, dirs = self._scan()
+            index = self._load_index()
+            next_number = int(index[-1]["id"].split('-')[1]) + 1 if index else 1
+            checkpoint_id = f"cp-{next_number}"
+
+            manifest = {"files": files, "dirs": dirs}
+            os.makedirs(self.manifests_dir, exist_ok=True)
+            self._write_json(os.path.join(self.manifests_dir, f"{checkpoint_id}.json"), manifest)
+            self._manifests[checkpoint_id] = manifest
+
+            index.append({"id": checkpoint_id, "label": label, "auto": auto, "created": time.time(), "files": len(files)})
+            if auto:
+                self._prune_auto(index, keep)
+            self._write_json(self.index_path, index)
+            return checkpoint_id
+
+    def list_checkpoints(self):
+        """Returns checkpoint metadata, oldest first."""
+        with self._lock:
+            return list(self._load_index())
+
+    def diff_since(self, checkpoint_id):
+        """Returns the files added, modified and deleted since a checkpoint."""
+        with self._lock:
+            manifest = self._load_manifest(checkpoint_id)
+            files, _ = self._scan()
+            old_files = manifest["files"]
+            return {
+                "added": sorted(set(files) - set(old_files)),
+                "modified": sorted(rel for rel in set(files) & set(old_files) if files[rel][0] != old_files[rel][0]),
+                "deleted": sorted(set(old_files) - set(files)),
+            }
+
+    def unified_diff(self, checkpoint_id, rel_path, max_lines=DIFF_MAX_LINES):
+        """Returns a unified diff of one file against its content at a checkpoint."""
+        with self._lock:
+            manifest = self._load_manifest(checkpoint_id)
+            old_lines = []
+            if rel_path in manifest["files"]:
+                old_lines = self._read_object_lines(manifest["files"][rel_path][0])
+            new_lines = []
+            current_path = os.path.join(self.root, rel_path)
+            if os.path.exists(current_path):
+                with open(current_path, 'r', errors='replace') as f:
+                    new_lines = f.readlines()
+            diff = list(difflib.unified_diff(old_lines, new_lines, f"a/{rel_path}", f"b/{rel_path}"))
+            if len(diff) > max_lines:
+                diff = diff[:max_lines] + [f"... ({len(diff) - max_lines} more diff lines)\n"]
+            return "".join(diff)
+
+    def rollback(self, checkpoint_id):
+        """
+        Restores the tree to a checkpoint. The current state is checkpointed first, so a
+        rollback can itself be undone. Returns counts of restored and removed files.
+        """
+        with self._lock:
+            manifest = self._load_manifest(checkpoint_id)
+            missing = sorted(rel for rel, (sha, _) in manifest["files"].items() if not os.path.exists(self._object_path(sha)))
+            if missing:
+                raise FileNotFoundError(f"Checkpoint '{checkpoint_id}' is missing stored content for: {', '.join(missing)}")
+            # The target must survive the pruning this checkpoint may trigger, or its objects go with it.
+            self.checkpoint(f"before rollback to {checkpoint_id}", auto=True, keep={checkpoint_id})
+            files, dirs = self._scan()
+
+            removed = 0
+            for rel in set(files) - set(manifest["files"]):
+                os.remove(os.path.join(self.root, rel))
+                self._stat_cache.pop(rel, None)
+                removed += 1
+            # Deepest first, so nested directories go before their parents.
+            for rel in sorted(set(dirs) - set(manifest["dirs"]), key=lambda d: d.count(os.sep), reverse=True):
+                shutil.rmtree(os.path.join(self.root, rel), ignore_errors=True)
+            for rel in manifest["dirs"]:
+                os.makedirs(os.path.join(self.root, rel), exist_ok=True)
+
+            restored = 0
+            for rel, (sha, mode) in manifest["files"].items():
+                if rel in files and files[rel][0] == sha:
+                    continue
+                self._restore_object(sha, mode, os.path.join(self.root, rel))
+                self._stat_cache.pop(rel, None)
+                restored += 1
+            return {"restored": restored, "removed": removed}
+
+    # --- Scanning and Objects ---
+
+    def _scan(self):
+        """Returns ({rel_path: [sha, mode]}, [rel_dir]), hashing only files whose stat changed."""
+        files = {}
+        dirs = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS)
+            rel_dir = os.path.relpath(dirpath, self.root)
+            if rel_dir != '.':
+                dirs.append(rel_dir)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, self.root)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                key = (st.st_size, st.st_mtime_ns, st.st_ino)
+                cached = self._stat_cache.get(rel)
+                if cached and cached[0] == key:
+                    sha = cached[1]
+                else:
+                    sha = self._store_object(path)
+                    self._stat_cache[rel] = (key, sha)
+                files[rel] = [sha, st.st_mode & 0o777]
+        for rel in set(self._stat_cache) - set(files):
+            del self._stat_cache[rel]
+        return files, dirs
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _store_object(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        sha = digest.hexdigest()
+        object_path = self._object_path(sha)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        return sha
+
+    def _restore_object(self, sha, mode, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.restore.tmp"
+        shutil.copyfile(self._object_path(sha), tmp_path)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, target)
+
+    def _read_object_lines(self, sha):
+        with open(self._object_path(sha), 'r', errors='replace') as f:
+            return f.readlines()
+
+    # --- Index and Manifests ---
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = []
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+        return self._index
+
+    def _load_manifest(self, checkpoint_id):
+        if checkpoint_id not in self._manifests:
+            path = os.path.join(self.manifests_dir, f"{checkpoint_id}.json")
+            if not os.path.exists(path):
+                raise KeyError(f"Checkpoint '{checkpoint_id}' does not exist.")
+            with open(path, 'r') as f:
+                self._manifests[checkpoint_id] = json.load(f)
+        return self._manifests[checkpoint_id]
+
+    def _prune_auto(self, index, keep=()):
+        """Drops the oldest automatic checkpoints beyond the limit and unreferenced objects."""
+        auto_ids = [entry["id"] for entry in index if entry["auto"]]
+        stale = set(auto_ids[:-self.max_auto]) - set(keep) if len(auto_ids) > self.max_auto else set()
+        if not stale:
+            return
+        index[:] = [entry for entry in index if entry["id"] not in stale]
+        for checkpoint_id in stale:
+            self._manifests.pop(checkpoint_id, None)
+            path = os.path.join(self.manifests_dir, f"{checkpoint_id}.json")
+            if os.path.exists(path):
+                os.remove(path)
+
+        referenced = set()
+        for entry in index:
+            referenced.update(sha for sha, _ in self._load_manifest(entry["id"])["files"].values())
+        referenced.update(sha for _, sha in self._stat_cache.values())
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                if name not in referenced:
+                    os.remove(os.path.join(dirpath, name))
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,225 @@
+# backend/embeddings.py
+
+import os
+import sys
+import json
+import queue
+import threading
+from concurrent.futures import Future
+
+# --- Embedding Backends ---
+# Indexing and querying share one embedding backend behind a bounded request queue.
+# On CPU-only deployments the int8-quantized ONNX backend and a multi-process pool
+# cut indexing time substantially; `python -m backend.embeddings` checks that
+# retrieval with the quantized model stays close to the float model.
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "float")  # "float" or "onnx-int8"
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_PROCESSES = int(os.environ.get("EMBEDDING_PROCESSES", 1))
+EMBEDDING_QUEUE_SIZE = int(os.environ.get("EMBEDDING_QUEUE_SIZE", 32))
+
+# Below this many texts, the process pool's IPC overhead outweighs the parallelism.
+MULTI_PROCESS_MIN_TEXTS = 256
+
+
+class SentenceTransformerBackend:
+    """Encodes with sentence-transformers, optionally int8-quantized and across processes."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, quantized=False,
+                 batch_size=EMBEDDING_BATCH_SIZE, processes=EMBEDDING_PROCESSES):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = "float"
+        self.batch_size = batch_size
+        self.pool = None
+        if quantized:
+            try:
+                self.model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_FILE})
+                self.name = "onnx-int8"
+            except Exception as e:
+                print(f"Quantized ONNX embedding backend unavailable ({e}); falling back to float.")
+        if self.name == "float":
+            self.model = SentenceTransformer(model_name)
+
+        if processes > 1:
+            try:
+                self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * processes)
+            except Exception as e:
+                print(f"Could not start embedding process pool ({e}); encoding in-process.")
+
+    def encode(self, texts):
+        if self.pool and len(texts) >= MULTI_PROCESS_MIN_TEXTS:
+            return self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        return self.model.encode(texts, batch_size=self.batch_size)
+
+    def close(self):
+        if self.pool:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+def create_backend(name=EMBEDDING_BACKEND):
+    """Builds the embedding backend selected by EMBEDDING_BACKEND."""
+    if name not in ("float", "onnx-int8"):
+        raise ValueError(f"Unknown embedding backend '{name}'.")
+    return SentenceTransformerBackend(quantized=(name == "onnx-int8"))
+
+
+def run_off_hub(fn, *args, **kwargs):
+    """
+    Calls `fn` on a real OS thread when gevent has patched threading, and directly
+    otherwise. Under the gevent worker, `threading.Thread` starts greenlets, so
+    CPU-bound native work (model loading, encoding) would hold the hub and stall every
+    other request until it finished.
+    """
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return fn(*args, **kwargs)
+    if not monkey.is_module_patched("threading"):
+        return fn(*args, **kwargs)
+    return get_hub().threadpool.apply(fn, args, kwargs)
+
+
+class EmbeddingQueue:
+    """
+    A bounded request queue in front of an embedding backend. A single worker thread
+    drains it and merges requests that arrive together into shared batches, so small
+    query-path requests ride along with indexing work instead of contending with it.
+    Encoding itself runs through `run_off_hub`, so it never blocks the gevent hub.
+    """
+
+    def __init__(self, backend, maxsize=EMBEDDING_QUEUE_SIZE, batch_size=EMBEDDING_BATCH_SIZE):
+        self.backend = backend
+        self.batch_size = batch_size
+        self._requests = queue.Queue(maxsize=maxsize)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, texts) -> Future:
+        """Queues texts for encoding, blocking while the queue is full."""
+        if self._closed:
+            raise RuntimeError("Embedding queue is closed.")
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future
+
+    def encode(self, texts):
+        """Encodes texts and waits for the result."""
+        return self.submit(texts).result()
+
+    def close(self):
+        self._closed = True
+        self._requests.put((None, None))
+        self._worker.join()
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            texts, future = self._requests.get()
+            if texts is None:
+                return
+            batch = [(texts, future)]
+            count = len(texts)
+            while count < self.batch_size:
+                try:
+                    texts, future = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if texts is None:
+                    stopping = True
+                    break
+                batch.append((texts, future))
+                count += len(texts)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        all_texts = [text for texts, _ in batch for text in texts]
+        try:
+            embeddings = run_off_hub(self.backend.encode, all_texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+_embedding_queue = None
+_embedding_queue_lock = threading.Lock()
+
+def get_embedding_queue():
+    """Returns the process-wide embedding queue, creating its backend on first use."""
+    global _embedding_queue
+    with _embedding_queue_lock:
+        if _embedding_queue is None:
+            _embedding_queue = EmbeddingQueue(run_off_hub(create_backend))
+        return _embedding_queue
+
+
+# --- Parity Check ---
+
+def parity_check(reference, candidate, documents, queries, k=5, tolerance=0.1, expected_candidate=None):
+    """
+    Compares top-k retrieval between two backends over the same corpus.
+    Returns the backends' names, the candidate's mean recall@k against the reference,
+    the mean cosine similarity between their document embeddings, and whether recall
+    is within tolerance. If `expected_candidate` is given, the check fails unless the
+    candidate actually loaded as that backend (the quantized one falls back to float).
+    """
+    import numpy as np
+
+    def normalize(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    reference_docs, candidate_docs = normalize(reference.encode(documents)), normalize(candidate.encode(documents))
+    reference_queries, candidate_queries = normalize(reference.encode(queries)), normalize(candidate.encode(queries))
+
+    k = min(k, len(documents))
+    reference_top = np.argsort(-(reference_queries @ reference_docs.T), axis=1)[:, :k]
+    candidate_top = np.argsort(-(candidate_queries @ candidate_docs.T), axis=1)[:, :k]
+    recall = float(np.mean([len(set(r) & set(c)) / k for r, c in zip(reference_top, candidate_top)]))
+    cosine = float(np.mean(np.sum(reference_docs * candidate_docs, axis=1)))
+
+    result = {
+        "reference": getattr(reference, "name", None), "candidate": getattr(candidate, "name", None),
+        "recall_at_k": recall, "mean_embedding_cosine": cosine, "passed": recall >= 1 - tolerance,
+    }
+    if expected_candidate is not None and result["candidate"] != expected_candidate:
+        result["passed"] = False
+        result["error"] = f"Candidate loaded as '{result['candidate']}', not '{expected_candidate}'."
+    return result
+
+
+def _sample_corpus(root, max_chunks=400):
+    """Collects 1024-character chunks from the project's source files, as the indexer does."""
+    chunks = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__']]
+        for name in files:
+            if not name.endswith(('.py', '.md', '.js')):
+                continue
+            with open(os.path.join(dirpath, name), 'r', errors='ignore') as f:
+                content = f.read()
+            chunks.extend(content[i:i+1024] for i in range(0, len(content), 1024))
+            if len(chunks) >= max_chunks:
+                return chunks[:max_chunks]
+    return chunks
+
+
+if __name__ == '__main__':
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    documents = _sample_corpus(project_root)
+    # Use the first meaningful line of every tenth chunk as a query.
+    queries = [next((line for line in d.splitlines() if line.strip()), d[:80]) for d in documents[::10]]
+    result = parity_check(create_backend("float"), create_backend("onnx-int8"), documents, queries, expected_candidate="onnx-int8")
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["passed"] else 1)
@@ -64,15 +64,20 @@ def stream_chat_response(chat_session, history):
     """
     Takes a chat session with full history and streams the final response.
     This function assumes the last message in the history is the one to respond to.
+    Once the stream completes, the model's reply is appended to `history`.
     """
     # Get a streaming response from the model.
     response_stream = chat_session.send_message(history[-1]["parts"], stream=True)
 
     # Yield each chunk of text as it arrives.
+    full_text = ""
     for chunk in response_stream:
         if chunk.text:
+            full_text += chunk.text
             # Format as a Server-Sent Event (SSE).
-            yield f"data: {json.dumps({'chunk': chunk.text})}\\n\\n"
+            yield f"data: {json.dumps({'chunk': chunk.text})}\n\n"
+
+    history.append({"role": "model", "parts": [Part(text=full_text)]})
 
 def serializable_history(history):
     """Converts the conversation history to a serializable format."""
@@ -0,0 +1,52 @@
+# backend/gunicorn.conf.py
+#
+# Production serving configuration: `gunicorn -c backend/gunicorn.conf.py backend.app:app`
+#
+# A single gevent worker serves every client. Each request (including long-lived SSE
+# chat streams) runs in a greenlet rather than an OS thread, so one slow stream or
+# model call does not block other clients. The agent's state lives in process
+# memory, which is why there is exactly one worker process.
+#
+# gevent monkey-patches threading, so the agent loop, the context retriever's executor
+# and the embedding queue's worker all run as greenlets on the same hub as the request
+# handlers. That is fine for I/O (model calls, ChromaDB's HTTP client, Docker), which
+# yields to the hub, but CPU-bound native work never yields: a torch encode or model
+# load would freeze every SSE stream and `/status` poll until it returned. Such work
+# must go through `backend.embeddings.run_off_hub`, which runs it on gevent's pool of
+# real OS threads. Only plain compute belongs there; code that touches gevent-patched
+# queues, locks or sockets must stay on the hub.
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = 1
+worker_class = "gevent"
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+
+# SSE streams are long-lived; only kill a worker that is truly stuck.
+timeout = int(os.environ.get("WORKER_TIMEOUT", 300))
+keepalive = 5
+
+# On SIGTERM, in-flight requests (including open chat streams) get this long to finish.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    """Makes gRPC cooperate with gevent and builds the sandbox image, as `app.py` does in dev mode."""
+    try:
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        worker.log.warning("grpc gevent support unavailable; model calls may block the worker.")
+
+    from backend.app import build_docker_image
+    build_docker_image()
+
+
+def worker_exit(server, worker):
+    """Stops the agent and persists chat sessions once gunicorn has drained in-flight requests."""
+    from backend.app import shutdown
+    shutdown(timeout=5)
@@ -0,0 +1,215 @@
+# backend/knowledge.py
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import threading
+
+# --- Knowledge Store ---
+# Learnings are kept as structured records with embeddings instead of an ever-growing
+# markdown file. Near-duplicates are merged, the store is held to a size budget by
+# evicting old, unused records, and only the learnings relevant to the current goal
+# are injected into the agent's prompt.
+
+KNOWLEDGE_MAX_CHARS = int(os.environ.get("KNOWLEDGE_MAX_CHARS", 200000))
+KNOWLEDGE_TOP_K = int(os.environ.get("KNOWLEDGE_TOP_K", 5))
+KNOWLEDGE_PROMPT_CHARS = int(os.environ.get("KNOWLEDGE_PROMPT_CHARS", 6000))
+DEDUP_THRESHOLD = 0.92
+SECONDS_PER_DAY = 86400
+
+
+def default_embed(texts):
+    """Embeds texts with the shared embedding queue, loaded on first use."""
+    from .embeddings import get_embedding_queue
+    return [[float(x) for x in vector] for vector in get_embedding_queue().encode(texts)]
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9_]+", text.lower()))
+
+
+def keyword_similarity(a, b):
+    """Jaccard overlap of words; the fallback when embeddings are unavailable."""
+    words_a, words_b = _words(a), _words(b)
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class KnowledgeStore:
+    """Structured, deduplicated learnings persisted as JSON."""
+
+    def __init__(self, path, embed=default_embed, max_chars=KNOWLEDGE_MAX_CHARS,
+                 dedup_threshold=DEDUP_THRESHOLD, legacy_markdown_path=None):
+        self.path = path
+        self.embed = embed
+        self.max_chars = max_chars
+        self.dedup_threshold = dedup_threshold
+        self.legacy_markdown_path = legacy_markdown_path
+        self._lock = threading.Lock()
+        self._records = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def add(self, text, kind="learning", key=None):
+        """
+        Records a learning. A record with the same `key` is replaced; a near-duplicate
+        of an existing record reinforces it instead of adding a new one.
+        Returns "added", "replaced" or "merged".
+        """
+        text = text.strip()
+        embedding = self._embed_one(text)
+        with self._lock:
+            records = self._load()
+            now = time.time()
+
+            if key is not None:
+                for record in records:
+                    if record.get("key") == key:
+                        record.update({"text": text, "embedding": embedding, "created": now})
+                        self._enforce_budget(records)
+                        self._save()
+                        return "replaced"
+
+            duplicate = self._most_similar(records, text, embedding, kind)
+            if duplicate is not None:
+                duplicate["reinforced"] += 1
+                duplicate["created"] = now
+                if len(text) > len(duplicate["text"]):
+                    duplicate["text"], duplicate["embedding"] = text, embedding
+                self._enforce_budget(records)
+                self._save()
+                return "merged"
+
+            records.append({
+                "id": uuid.uuid4().hex, "kind": kind, "key": key, "text": text, "embedding": embedding,
+                "created": now, "last_used": None, "uses": 0, "reinforced": 0,
+            })
+            self._enforce_budget(records)
+            self._save()
+            return "added"
+
+    def relevant(self, query, k=KNOWLEDGE_TOP_K):
+        """Returns the top-k records most relevant to `query` and marks them as used."""
+        if not query:
+            return []
+        query_embedding = self._embed_one(query)
+        with self._lock:
+            records = self._load()
+            scored = sorted(
+                ((self._similarity(record, query, query_embedding), record) for record in records),
+                key=lambda pair: pair[0], reverse=True,
+            )
+            top = [record for score, record in scored[:k] if score > 0]
+            now = time.time()
+            for record in top:
+                record["uses"] += 1
+                record["last_used"] = now
+            if top:
+                self._save()
+            return [dict(record) for record in top]
+
+    def format_relevant(self, query, k=KNOWLEDGE_TOP_K, max_chars=KNOWLEDGE_PROMPT_CHARS):
+        """Formats the relevant learnings for the prompt, within a character budget."""
+        sections = []
+        used = 0
+        for record in self.relevant(query, k):
+            section = f"- ({record['kind']}) {record['text']}"
+            if used + len(section) > max_chars:
+                continue
+            sections.append(section)
+            used += len(section)
+        return "\n".join(sections)
+
+    # --- Internals ---
+
+    def _embed_one(self, text):
+        embeddings = self._embed_many([text])
+        return embeddings[0] if embeddings else None
+
+    def _embed_many(self, texts):
+        if self.embed is None:
+            return None
+        try:
+            return self.embed(texts)
+        except Exception as e:
+            # Don't retry on every call; fall back to keyword matching from now on.
+            print(f"Knowledge store embedding unavailable ({e}); using keyword matching.")
+            self.embed = None
+            return None
+
+    def _similarity(self, record, text, embedding):
+        if embedding is not None and record.get("embedding") is not None:
+            return cosine_similarity(record["embedding"], embedding)
+        return keyword_similarity(record["text"], text)
+
+    def _most_similar(self, records, text, embedding, kind):
+        best, best_score = None, self.dedup_threshold
+        for record in records:
+            if record["kind"] != kind:
+                continue
+            score = self._similarity(record, text, embedding)
+            if score >= best_score:
+                best, best_score = record, score
+        return best
+
+    def _enforce_budget(self, records):
+        """Evicts the records with the lowest usefulness-per-age score until under budget."""
+        total = sum(len(record["text"]) for record in records)
+        if total <= self.max_chars:
+            return
+        now = time.time()
+
+        def score(record):
+            age_days = (now - (record["last_used"] or record["created"])) / SECONDS_PER_DAY
+            return (1 + record["uses"] + record["reinforced"]) / (1 + age_days)
+
+        for record in sorted(records, key=score):
+            if total <= self.max_chars or len(records) == 1:
+                break
+            records.remove(record)
+            total -= len(record["text"])
+
+    def _load(self):
+        if self._records is None:
+            self._records = []
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self._records = json.load(f)
+            elif self.legacy_markdown_path and os.path.exists(self.legacy_markdown_path):
+                self._import_legacy_markdown()
+        return self._records
+
+    def _import_legacy_markdown(self):
+        """Migrates learnings previously appended to the markdown knowledge base."""
+        with open(self.legacy_markdown_path, 'r') as f:
+            content = f.read()
+        texts = [text.strip() for text in re.findall(r"\*\*Learning recorded at [^*]+:\*\*\n(.*?)(?=\n---\n|\Z)", content, re.S)]
+        embeddings = self._embed_many(texts) if texts else None
+        for i, text in enumerate(texts):
+            self._records.append({
+                "id": uuid.uuid4().hex, "kind": "learning", "key": None, "text": text,
+                "embedding": embeddings[i] if embeddings else None, "created": time.time(), "last_used": None, "uses": 0, "reinforced": 0,
+            })
+        if texts:
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._records, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,153 @@
+# backend/patching.py
+
+import re
+import difflib
+
+# --- Text Patching ---
+# Pure helpers behind the `edit_files` and `apply_patch` tools. Each edit is checked
+# against the file's current content before anything is applied, so a stale or
+# ambiguous edit fails loudly instead of corrupting the file.
+
+SUMMARY_MAX_LINES = 40
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """Raised when an edit does not match the content it is applied to."""
+
+
+def apply_search_replace(text, search, replace):
+    """Replaces the single occurrence of `search` in `text`."""
+    if not search:
+        raise PatchError("Search text must not be empty.")
+    count = text.count(search)
+    if count == 0:
+        raise PatchError("Search text not found.")
+    if count > 1:
+        raise PatchError(f"Search text matches {count} times; include more surrounding context.")
+    return text.replace(search, replace, 1)
+
+
+def apply_line_range(text, start_line, end_line, content, expected=None):
+    """
+    Replaces lines `start_line`..`end_line` (1-based, inclusive) with `content`.
+    An `end_line` of `start_line - 1` inserts before `start_line`. If `expected` is
+    given, the replaced lines must match it exactly.
+    """
+    lines = text.splitlines(keepends=True)
+    start_line, end_line = int(start_line), int(end_line)
+    if start_line < 1 or end_line < start_line - 1 or end_line > len(lines):
+        raise PatchError(f"Line range {start_line}-{end_line} is outside the file ({len(lines)} lines).")
+    if expected is not None and "".join(lines[start_line - 1:end_line]).rstrip("\n") != expected.rstrip("\n"):
+        raise PatchError(f"Lines {start_line}-{end_line} do not match the expected content.")
+    if content and not content.endswith("\n"):
+        content += "\n"
+    return "".join(lines[:start_line - 1]) + content + "".join(lines[end_line:])
+
+
+def parse_unified_diff(patch):
+    """
+    Parses a (possibly multi-file) unified diff into a list of
+    {"old_path", "new_path", "hunks"} dicts. Paths are None for /dev/null.
+    Hunk line counts are checked against the hunk bodies, since a miscounted
+    hunk would otherwise drop lines or swallow the next file's headers.
+    """
+    files = []
+    current = None
+    hunk = None
+    lines = patch.splitlines()
+    for i, line in enumerate(lines):
+        open_hunk = hunk is not None and (hunk["remaining_old"] > 0 or hunk["remaining_new"] > 0)
+        is_file_header = line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")
+        if line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        if open_hunk and (is_file_header or line.startswith("@@")):
+            raise PatchError(f"Hunk at line {hunk['old_start']} has fewer lines than its header states.")
+        if is_file_header or (line.startswith("--- ") and hunk is None):
+            current = {"old_path": _diff_path(line[4:]), "new_path": None, "hunks": []}
+            files.append(current)
+            hunk = None
+        elif line.startswith("+++ ") and current is not None and not current["hunks"]:
+            current["new_path"] = _diff_path(line[4:])
+        elif line.startswith("@@"):
+            match = HUNK_HEADER.match(line)
+            if not match or current is None:
+                raise PatchError(f"Malformed hunk header: {line}")
+            hunk = {
+                "old_start": int(match.group(1)),
+                "remaining_old": int(match.group(2) or 1),
+                "remaining_new": int(match.group(4) or 1),
+                "lines": [],
+            }
+            current["hunks"].append(hunk)
+        elif open_hunk and line[:1] in (" ", "-", "+", ""):
+            tag = line[:1] or " "
+            if tag in (" ", "-"):
+                hunk["remaining_old"] -= 1
+            if tag in (" ", "+"):
+                hunk["remaining_new"] -= 1
+            if hunk["remaining_old"] < 0 or hunk["remaining_new"] < 0:
+                raise PatchError(f"Hunk at line {hunk['old_start']} has more lines than its header states.")
+            hunk["lines"].append((tag, line[1:]))
+        elif hunk is not None and line[:1] in (" ", "-", "+"):
+            raise PatchError(f"Hunk at line {hunk['old_start']} has more lines than its header states.")
+    if hunk is not None and (hunk["remaining_old"] > 0 or hunk["remaining_new"] > 0):
+        raise PatchError(f"Hunk at line {hunk['old_start']} has fewer lines than its header states.")
+    if not files:
+        raise PatchError("No file headers found in patch.")
+    return files
+
+
+def _diff_path(header):
+    path = header.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+
+def apply_hunks(text, hunks):
+    """
+    Applies parsed hunks to `text`. Each hunk's context and removed lines must match
+    the file; if they moved, the nearest exact match to the stated position is used.
+    """
+    lines = text.splitlines()
+    trailing_newline = text.endswith("\n") or not text
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        old_block = [content for tag, content in hunk["lines"] if tag in (" ", "-")]
+        new_block = [content for tag, content in hunk["lines"] if tag in (" ", "+")]
+        expected_at = max(hunk["old_start"] - 1 + offset, 0)
+        if not old_block:
+            position = min(hunk["old_start"] + offset, len(lines)) if hunk["old_start"] else 0
+        else:
+            position = _find_block(lines, old_block, expected_at)
+            if position is None:
+                raise PatchError(f"Hunk {number} (line {hunk['old_start']}) does not match the file.")
+        lines[position:position + len(old_block)] = new_block
+        offset += len(new_block) - len(old_block)
+    return "\n".join(lines) + ("\n" if trailing_newline and lines else "")
+
+
+def _find_block(lines, block, expected_at):
+    candidates = [
+        i for i in range(len(lines) - len(block) + 1)
+        if lines[i] == block[0] and lines[i:i + len(block)] == block
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda i: abs(i - expected_at))
+
+
+def summarize_change(path, old_text, new_text, max_lines=SUMMARY_MAX_LINES):
+    """Returns a compact summary: added/removed line counts and a tight unified diff."""
+    diff = list(difflib.unified_diff(
+        old_text.splitlines(), new_text.splitlines(), f"a/{path}", f"b/{path}", n=1, lineterm=""
+    ))
+    added = sum(1 for line in diff if line.startswith("+") and not line.startswith("+++"))
+    removed = sum(1 for line in diff if line.startswith("-") and not line.startswith("---"))
+    body = diff[2:]
+    if len(body) > max_lines:
+        body = body[:max_lines] + [f"... ({len(body) - max_lines} more diff lines)"]
+    return "\n".join([f"{path}: +{added} -{removed}"] + body)
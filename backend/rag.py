@@ -3,14 +3,43 @@
 import os
 import json
 import chromadb
-from sentence_transformers import SentenceTransformer
-from .app import project_root, last_indexed_path
+from .tools import project_root
+from .embeddings import get_embedding_queue
 
-# Initialize ChromaDB and Sentence Transformer
+last_indexed_path = os.path.join(project_root, 'backend', 'last_indexed.json')
+
+# Internal stores, caches and conversation logs that would only add noise to the index.
+SKIPPED_DIRS = {'.git', '.checkpoints', 'raw-conversations', '__pycache__', '.pytest_cache', 'node_modules'}
+SKIPPED_FILES = {os.path.join('backend', 'knowledge.json'), os.path.join('backend', 'last_indexed.json')}
+
+# Initialize ChromaDB and the embedding queue
 # The host 'chroma' is the service name defined in docker-compose.yml
 client = chromadb.HttpClient(host='chroma', port=8000)
 collection = client.get_or_create_collection("codebase")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+embedder = get_embedding_queue()
+
+# Changed files are embedded together once this many chunks are pending.
+INDEX_BATCH_CHUNKS = 256
+
+def store_embedded_files(pending, future, last_indexed):
+    """Waits for a batch of embedded files and writes them to the collection."""
+    try:
+        embeddings = future.result()
+    except Exception as e:
+        print(f"Error embedding {len(pending)} files: {e}")
+        return
+
+    offset = 0
+    for rel_path, mtime, chunks in pending:
+        file_embeddings = embeddings[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            ids = [f"{rel_path}-{i}" for i in range(len(chunks))]
+            collection.delete(where={"filepath": rel_path})
+            collection.add(embeddings=file_embeddings.tolist(), documents=chunks, metadatas=[{"filepath": rel_path} for _ in chunks], ids=ids)
+            last_indexed[rel_path] = mtime
+        except Exception as e:
+            print(f"Error indexing {rel_path}: {e}")
 
 def index_codebase():
     """Indexes the codebase, including the knowledge base."""
@@ -24,10 +53,11 @@ def index_codebase():
         indexed_files = set(last_indexed.keys())
         current_files = set()
         for root, dirs, files in os.walk(project_root):
-            if '.git' in dirs: dirs.remove('.git')
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS]
             for file in files:
                 rel_path = os.path.relpath(os.path.join(root, file), project_root)
-                current_files.add(rel_path)
+                if rel_path not in SKIPPED_FILES:
+                    current_files.add(rel_path)
 
         deleted_files = indexed_files - current_files
         if deleted_files:
@@ -36,12 +66,25 @@ def index_codebase():
                 if filepath in last_indexed:
                     del last_indexed[filepath]
 
+        # Files are embedded in batches. While one batch is being encoded, the next is read from disk.
+        pending, pending_chunks, in_flight = [], 0, None
+
+        def flush_pending():
+            nonlocal pending, pending_chunks, in_flight
+            future = embedder.submit([c for _, _, file_chunks in pending for c in file_chunks])
+            if in_flight:
+                store_embedded_files(*in_flight, last_indexed)
+            in_flight = (pending, future)
+            pending, pending_chunks = [], 0
+
         for root, dirs, files in os.walk(project_root):
-            if '.git' in dirs: dirs.remove('.git')
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS]
 
             for file in files:
                 filepath = os.path.join(root, file)
                 rel_path = os.path.relpath(filepath, project_root)
+                if rel_path in SKIPPED_FILES:
+                    continue
                 try:
                     mtime = os.path.getmtime(filepath)
                     if rel_path in last_indexed and mtime <= last_indexed[rel_path]:
@@ -54,15 +97,18 @@ def index_codebase():
                     if not chunks:
                         continue
 
-                    embeddings = embedding_model.encode(chunks)
-                    ids = [f"{rel_path}-{i}" for i in range(len(chunks))]
-
-                    collection.delete(where={"filepath": rel_path})
-                    collection.add(embeddings=embeddings.tolist(), documents=chunks, metadatas=[{"filepath": rel_path} for _ in chunks], ids=ids)
-                    last_indexed[rel_path] = mtime
+                    pending.append((rel_path, mtime, chunks))
+                    pending_chunks += len(chunks)
+                    if pending_chunks >= INDEX_BATCH_CHUNKS:
+                        flush_pending()
                 except Exception as e:
                     print(f"Error indexing {filepath}: {e}")
 
+        if pending:
+            flush_pending()
+        if in_flight:
+            store_embedded_files(*in_flight, last_indexed)
+
         with open(last_indexed_path, 'w') as f:
             json.dump(last_indexed, f)
 
@@ -70,13 +116,20 @@ def index_codebase():
     except Exception as e:
         return {"error": str(e)}
 
-def query_codebase(message: str, n_results: int = 5):
-    """Queries the codebase for relevant snippets."""
-    query_embedding = embedding_model.encode([message])
-    results = collection.query(query_embeddings=[query_embedding.tolist()], n_results=n_results)
+def retrieve_snippets(message: str, n_results: int = 5):
+    """Returns the most relevant snippets, best first, as dicts with `filepath` and `document`."""
+    query_embedding = embedder.encode([message])
+    results = collection.query(query_embeddings=query_embedding.tolist(), n_results=n_results)
 
-    rag_context = "Relevant code snippets and learnings:\\n"
+    snippets = []
     if results['documents']:
         for i, doc in enumerate(results['documents'][0]):
-            rag_context += f"--- Snippet {i+1} from {results['metadatas'][0][i]['filepath']} ---\\n{doc}\\n"
+            snippets.append({"filepath": results['metadatas'][0][i]['filepath'], "document": doc})
+    return snippets
+
+def query_codebase(message: str, n_results: int = 5):
+    """Queries the codebase for relevant snippets."""
+    rag_context = "Relevant code snippets and learnings:\n"
+    for i, snippet in enumerate(retrieve_snippets(message, n_results)):
+        rag_context += f"--- Snippet {i+1} from {snippet['filepath']} ---\n{snippet['document']}\n"
     return rag_context
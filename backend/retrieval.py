@@ -0,0 +1,195 @@
+# backend/retrieval.py
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# --- Automatic Context Retrieval ---
+# Each agent turn queries the RAG index for snippets relevant to the current plan and
+# scratchpad, so the model sees likely-relevant code without spending tool turns on
+# `list_files` / `read_file` exploration. The index is refreshed incrementally when a
+# run starts and after the agent changes files, so injected code is never older than
+# the workspace.
+
+RAG_TOKEN_BUDGET = int(os.environ.get("RAG_TOKEN_BUDGET", 1500))
+RAG_N_RESULTS = int(os.environ.get("RAG_N_RESULTS", 8))
+RAG_TIMEOUT = float(os.environ.get("RAG_TIMEOUT", 5))
+RAG_HISTORY_WINDOW = 6
+CHARS_PER_TOKEN = 4
+EXPLORATORY_TOOLS = {"read_file", "list_files"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough for budgeting prompt sections."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def default_search(query: str, n_results: int):
+    """Searches the ChromaDB index. Imported lazily so the agent runs without it."""
+    from .rag import retrieve_snippets
+    return retrieve_snippets(query, n_results)
+
+
+def default_refresh():
+    """Incrementally re-indexes files whose mtime changed since the last index."""
+    from .rag import index_codebase
+    result = index_codebase()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+
+def recent_history_text(history, window=RAG_HISTORY_WINDOW) -> str:
+    """Flattens the text of the most recent history entries for overlap checks."""
+    chunks = []
+    for entry in history[-window:]:
+        for part in entry.get("parts", []):
+            if not isinstance(part, dict):
+                chunks.append(str(part))
+            elif "text" in part:
+                chunks.append(part["text"])
+            elif "function_response" in part:
+                for response in part["function_response"].get("responses", []):
+                    chunks.append(str(response.get("content", "")))
+    return "\n".join(chunks)
+
+
+def select_snippets(snippets, recent_text, token_budget):
+    """
+    Picks snippets in rank order that fit in the token budget, skipping any whose
+    content is already visible in recent history. Returns (selected, skipped_count).
+    """
+    selected = []
+    skipped = 0
+    used = 0
+    for snippet in snippets:
+        document = snippet["document"].strip()
+        if not document or document in recent_text:
+            skipped += 1
+            continue
+        cost = estimate_tokens(document)
+        if used + cost > token_budget:
+            continue
+        selected.append(snippet)
+        used += cost
+    return selected, skipped
+
+
+def format_snippets(snippets) -> str:
+    return "\n".join(f"--- Snippet from {s['filepath']} ---\n{s['document']}" for s in snippets)
+
+
+class ContextRetriever:
+    """
+    Runs index refreshes and retrieval for agent turns on one background thread, in
+    submission order, and records how many exploratory tool calls the injected
+    context appears to have saved.
+    """
+
+    def __init__(self, search=default_search, refresh=default_refresh, token_budget=RAG_TOKEN_BUDGET,
+                 n_results=RAG_N_RESULTS, timeout=RAG_TIMEOUT):
+        self.search = search
+        self.refresh = refresh
+        self.token_budget = token_budget
+        self.n_results = n_results
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self._last_query = None
+        self._last_results = []
+        self._pending = None
+        self._index_current = False
+        self._files_supplied = set()
+        self._files_read_after_supply = set()
+        self.stats = {
+            "turns_with_context": 0,
+            "snippets_injected": 0,
+            "snippets_skipped_in_history": 0,
+            "retrieval_failures": 0,
+            "index_refreshes": 0,
+            "index_refresh_failures": 0,
+            "exploratory_tool_calls": 0,
+            "files_supplied": 0,
+            "estimated_reads_saved": 0,
+        }
+
+    def refresh_index(self):
+        """
+        Queues an incremental re-index ahead of any later retrieval. Until it succeeds,
+        no context is injected, since snippets could predate the agent's own edits.
+        """
+        self._index_current = False
+        self._last_query, self._pending = None, None
+        self.executor.submit(self._refresh)
+
+    def _refresh(self):
+        try:
+            self.refresh()
+            self._index_current = True
+            self.stats["index_refreshes"] += 1
+        except Exception as e:
+            self.stats["index_refresh_failures"] += 1
+            print(f"Index refresh failed: {e}")
+
+    def submit(self, query: str) -> Future:
+        """
+        Starts retrieval for `query`. The agent submits the next turn's query when a
+        turn ends, so the search overlaps confirmation waits; resubmitting the same
+        query returns the pending search.
+        """
+        if self._pending and self._pending[0] == query:
+            return self._pending[1]
+        if query == self._last_query:
+            future = Future()
+            future.set_result(self._last_results)
+        else:
+            future = self.executor.submit(self._search, query)
+        self._pending = (query, future)
+        return future
+
+    def _search(self, query):
+        if not self._index_current:
+            raise RuntimeError("Index is not up to date with the workspace.")
+        results = self.search(query, self.n_results)
+        self._last_query, self._last_results = query, results
+        return results
+
+    def collect(self, future: Future, history) -> str:
+        """Waits for a submitted retrieval and returns the context to inject, if any."""
+        self._pending = None
+        recent_text = recent_history_text(history)
+        try:
+            snippets = future.result(timeout=self.timeout)
+        except Exception as e:
+            self.stats["retrieval_failures"] += 1
+            print(f"Context retrieval failed: {e}")
+            return ""
+
+        selected, skipped = select_snippets(snippets, recent_text, self.token_budget)
+        self.stats["snippets_skipped_in_history"] += skipped
+        if not selected:
+            return ""
+
+        self.stats["turns_with_context"] += 1
+        self.stats["snippets_injected"] += len(selected)
+        self._files_supplied.update(os.path.normpath(s["filepath"]) for s in selected)
+        self._update_savings()
+        return format_snippets(selected)
+
+    def record_tool_call(self, tool_name, args):
+        """
+        Tracks exploratory tool use. A supplied file that the model never reads
+        afterwards counts as one saved `read_file` turn.
+        """
+        if tool_name not in EXPLORATORY_TOOLS:
+            return
+        self.stats["exploratory_tool_calls"] += 1
+        if tool_name == "read_file":
+            path = os.path.normpath(args.get("filepath", ""))
+            if path in self._files_supplied:
+                self._files_read_after_supply.add(path)
+        self._update_savings()
+
+    def _update_savings(self):
+        self.stats["files_supplied"] = len(self._files_supplied)
+        self.stats["estimated_reads_saved"] = len(self._files_supplied - self._files_read_after_supply)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
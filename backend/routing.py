@@ -0,0 +1,125 @@
+# backend/routing.py
+
+import os
+import re
+import json
+import time
+
+# --- Model Cascade Routing ---
+# Routine agent turns go to a fast, cheap model. The loop reports what happens on each
+# turn, and the router escalates to the strong model for a few turns when it sees
+# trouble: repeated test failures, malformed tool calls, text where a tool call was
+# expected, or an explicit planning step.
+
+ROUTER_FAST_MODEL = os.environ.get("ROUTER_FAST_MODEL", "gemini-1.5-flash")
+
+DEFAULT_ROUTING_RULES = {
+    # Consecutive failing `run_tests` results before escalating.
+    "test_failures": 2,
+    # Consecutive unknown tools or tool calls that raise before escalating.
+    "malformed_tool_calls": 1,
+    # Consecutive text-instead-of-tool-call responses before escalating.
+    "text_responses": 1,
+    # Turns at the start of a run (and after a denied confirmation) that are planning steps.
+    "planning_turns": 1,
+    # How many turns an escalation lasts before returning to the fast model.
+    "escalation_turns": 2,
+}
+
+TEST_FAILURE_PATTERN = re.compile(r"\b\d+ (failed|errors?)\b|^(FAILED|ERROR) ", re.M)
+
+
+def load_routing_rules(overrides=None):
+    """Merges the defaults with ROUTING_RULES (a JSON object) and per-run overrides."""
+    rules = dict(DEFAULT_ROUTING_RULES)
+    env_rules = os.environ.get("ROUTING_RULES")
+    if env_rules:
+        rules.update(json.loads(env_rules))
+    if overrides:
+        rules.update(overrides)
+    unknown = set(rules) - set(DEFAULT_ROUTING_RULES)
+    if unknown:
+        raise ValueError(f"Unknown routing rules: {', '.join(sorted(unknown))}")
+    return {key: int(value) for key, value in rules.items()}
+
+
+class ModelRouter:
+    """Chooses the fast or strong model for each agent turn and records routing statistics."""
+
+    def __init__(self, fast_model, strong_model, rules=None):
+        self.models = {"fast": fast_model, "strong": strong_model}
+        self.rules = rules or dict(DEFAULT_ROUTING_RULES)
+        self._escalation_remaining = 0
+        self._escalation_reason = None
+        self._planning_remaining = self.rules["planning_turns"]
+        self._counters = {"test_failures": 0, "malformed_tool_calls": 0, "text_responses": 0}
+        self.stats = {
+            "turns": {"fast": 0, "strong": 0},
+            "latency_seconds": {"fast": 0.0, "strong": 0.0},
+            "average_latency_seconds": {"fast": 0.0, "strong": 0.0},
+            "escalations": 0,
+            "escalation_reasons": {},
+        }
+
+    def select(self):
+        """Returns (model, tier, reason) for the next turn."""
+        if self.models["fast"] is self.models["strong"]:
+            return self.models["strong"], "strong", "single model"
+        if self._planning_remaining > 0:
+            self._planning_remaining -= 1
+            return self.models["strong"], "strong", "planning step"
+        if self._escalation_remaining > 0:
+            self._escalation_remaining -= 1
+            return self.models["strong"], "strong", self._escalation_reason
+        return self.models["fast"], "fast", "routine turn"
+
+    def generate(self, *args, **kwargs):
+        """Runs the next turn on the selected model, recording its latency."""
+        model, tier, _ = self.select()
+        start = time.perf_counter()
+        try:
+            return model.generate_content(*args, **kwargs)
+        finally:
+            self.record_latency(tier, time.perf_counter() - start)
+
+    def record_latency(self, tier, seconds):
+        self.stats["turns"][tier] += 1
+        self.stats["latency_seconds"][tier] += seconds
+        self.stats["average_latency_seconds"][tier] = self.stats["latency_seconds"][tier] / self.stats["turns"][tier]
+
+    # --- Signals ---
+
+    def observe_text_response(self):
+        self._bump("text_responses", "text instead of tool call")
+
+    def observe_malformed_tool_call(self):
+        self._bump("malformed_tool_calls", "malformed tool call")
+
+    def observe_tool_result(self, tool_name, output):
+        """Tracks test outcomes; any successful tool call clears the malformed-call streak."""
+        self._counters["malformed_tool_calls"] = 0
+        self._counters["text_responses"] = 0
+        if tool_name != "run_tests":
+            return
+        if TEST_FAILURE_PATTERN.search(str(output)):
+            self._bump("test_failures", "repeated test failures")
+        else:
+            self._counters["test_failures"] = 0
+
+    def request_planning(self):
+        """Marks the next turns as planning steps for the strong model."""
+        self._planning_remaining = max(self._planning_remaining, self.rules["planning_turns"])
+
+    def _bump(self, counter, reason):
+        self._counters[counter] += 1
+        if self._counters[counter] >= self.rules[counter]:
+            self._counters[counter] = 0
+            self._escalate(reason)
+
+    def _escalate(self, reason):
+        if self.models["fast"] is self.models["strong"] or self.rules["escalation_turns"] <= 0:
+            return
+        self._escalation_remaining = self.rules["escalation_turns"]
+        self._escalation_reason = reason
+        self.stats["escalations"] += 1
+        self.stats["escalation_reasons"][reason] = self.stats["escalation_reasons"].get(reason, 0) + 1
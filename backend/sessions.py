@@ -0,0 +1,209 @@
+# backend/sessions.py
+
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# --- Chat Session Store ---
+# Keeps already-constructed conversation history on the server so that chat
+# clients only need to send the new message plus their session id and version.
+
+DEFAULT_MAX_SESSIONS = 64
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class SessionVersionConflict(Exception):
+    """Raised when a client's session version does not match the server's."""
+
+    def __init__(self, session_id, expected, actual):
+        super().__init__(f"Session '{session_id}' is at version {actual}, client sent {expected}.")
+        self.session_id = session_id
+        self.expected = expected
+        self.actual = actual
+
+
+def approximate_size(entries) -> int:
+    """Roughly estimates the memory footprint of a list of history entries."""
+    size = 0
+    for entry in entries:
+        for part in entry.get("parts", []):
+            if isinstance(part, dict):
+                size += len(json.dumps(part, default=str))
+            else:
+                size += len(str(part))
+    return size
+
+
+class ChatSession:
+    """A single conversation, holding history in its model-ready form."""
+
+    def __init__(self, session_id, history=None, version=0):
+        self.session_id = session_id
+        self.history = history or []
+        self.version = version
+        self.size = approximate_size(self.history)
+        self.last_access = time.time()
+        # Reentrant: a chat stream holds it while `SessionStore.append` stores the turn.
+        self.lock = threading.RLock()
+        # A live model chat bound to this history, reused across requests for the same model.
+        self.chat = None
+        self.model_name = None
+
+
+class SessionStore:
+    """
+    An LRU store of chat sessions, bounded by session count and total size.
+    If a persistence directory is given, evicted sessions are spilled to disk
+    and transparently reloaded the next time they are requested.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, max_bytes=DEFAULT_MAX_BYTES,
+                 persist_dir=None, serialize=None, deserialize=None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.persist_dir = persist_dir
+        self.serialize = serialize or (lambda history: history)
+        self.deserialize = deserialize or (lambda data: data)
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions or os.path.exists(self._session_path(session_id) or "")
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def create(self, history=None):
+        """Creates a new session, optionally seeded with constructed history."""
+        session = ChatSession(uuid.uuid4().hex, history)
+        with self._lock:
+            self._insert(session)
+        return session
+
+    def get(self, session_id):
+        """Returns a session by id, reloading it from disk if it was evicted."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id)
+                if session is None:
+                    return None
+                self._insert(session)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_access = time.time()
+            return session
+
+    def append(self, session_id, entries, expected_version):
+        """
+        Appends new history entries to a session and bumps its version.
+        Raises KeyError for unknown sessions and SessionVersionConflict when the
+        client is out of sync with the server.
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        with session.lock:
+            if session.version != expected_version:
+                raise SessionVersionConflict(session_id, expected_version, session.version)
+            added = approximate_size(entries)
+            session.history.extend(entries)
+            session.version += 1
+            session.size += added
+        with self._lock:
+            if session_id in self._sessions:
+                self._total_bytes += added
+            self._evict()
+        return session.version
+
+    def replace(self, session_id, history):
+        """Replaces a session's history wholesale, e.g. after a client resync."""
+        session = self.get(session_id)
+        if session is None:
+            session = ChatSession(session_id)
+        with self._lock:
+            if session_id in self._sessions:
+                self._total_bytes -= session.size
+                del self._sessions[session_id]
+            session.history = history
+            session.size = approximate_size(history)
+            session.version += 1
+            # The cached live chat holds the old history; rebuild it from the new one.
+            session.chat = None
+            session.model_name = None
+            self._insert(session)
+        return session
+
+    def delete(self, session_id):
+        """Drops a session from memory and disk."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.size
+        path = self._session_path(session_id)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def flush(self):
+        """Writes every in-memory session to disk, if persistence is enabled."""
+        if not self.persist_dir:
+            return
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self._save(session)
+
+    # --- Internals ---
+
+    def _insert(self, session):
+        self._sessions[session.session_id] = session
+        self._total_bytes += session.size
+        self._evict()
+
+    def _evict(self):
+        # Always keep the most recently used session, even if it alone exceeds the budget.
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            _, evicted = self._sessions.popitem(last=False)
+            self._total_bytes -= evicted.size
+            self._save(evicted)
+
+    def _session_path(self, session_id):
+        if not self.persist_dir or not session_id.isalnum():
+            return None
+        return os.path.join(self.persist_dir, f"{session_id}.json")
+
+    def _save(self, session):
+        path = self._session_path(session.session_id)
+        if not path:
+            return
+        try:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"version": session.version, "history": self.serialize(session.history)}, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error persisting chat session {session.session_id}: {e}")
+
+    def _load(self, session_id):
+        path = self._session_path(session_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return ChatSession(session_id, self.deserialize(data["history"]), data["version"])
+        except Exception as e:
+            print(f"Error loading chat session {session_id}: {e}")
+            return None
@@ -0,0 +1,151 @@
+# backend/state.py
+
+import os
+import threading
+from collections import deque
+
+# --- Agent State ---
+# The agent thread writes state while Flask request threads read it. All access goes
+# through one lock, every change bumps a version counter, and readers can either take
+# a cheap snapshot or fetch only what changed since a version they already have.
+# Growing text (the scratchpad and tool log) lives in segmented append-only logs with
+# a bounded visible window, so appending never copies the whole history.
+
+SCRATCHPAD_WINDOW_CHARS = int(os.environ.get("SCRATCHPAD_WINDOW_CHARS", 12000))
+TOOL_LOG_WINDOW_CHARS = int(os.environ.get("TOOL_LOG_WINDOW_CHARS", 20000))
+
+
+class AppendLog:
+    """
+    A segmented, append-only text buffer. Only the most recent `window_chars` of
+    segments stay visible; older segments are appended to `archive_path`, if given.
+    """
+
+    def __init__(self, window_chars, archive_path=None, separator="\n"):
+        self.window_chars = window_chars
+        self.archive_path = archive_path
+        self.separator = separator
+        self._segments = deque()
+        self._chars = 0
+        self._text = ""
+        self._reset_version = 0
+        self._archived_version = 0
+
+    def append(self, text, version):
+        self._segments.append((version, text))
+        self._chars += len(text) + len(self.separator)
+        self._text = None
+        archived = []
+        while self._chars > self.window_chars and len(self._segments) > 1:
+            old_version, old_text = self._segments.popleft()
+            self._chars -= len(old_text) + len(self.separator)
+            self._archived_version = old_version
+            archived.append(old_text)
+        if archived:
+            self._archive(archived)
+
+    def reset(self, text, version):
+        """Replaces the visible content, e.g. after a manual edit. Only the last `window_chars` are kept."""
+        if len(text) > self.window_chars:
+            self._archive([text[:-self.window_chars]])
+            text = text[-self.window_chars:]
+        self._segments = deque([(version, text)])
+        self._chars = len(text)
+        self._text = text
+        self._reset_version = version
+
+    def text(self):
+        if self._text is None:
+            self._text = self.separator.join(text for _, text in self._segments)
+        return self._text
+
+    def since(self, version):
+        """
+        Returns {"reset": False, "text": appended_text} for content added after `version`,
+        or {"reset": True, "text": full_text} when the reader must replace its copy.
+        `length` is the length of the visible text: after appending, a reader keeps only
+        that many trailing characters, dropping what has scrolled out of the window.
+        """
+        length = len(self.text())
+        if version < self._reset_version or version < self._archived_version:
+            return {"reset": True, "text": self.text(), "length": length}
+        appended = "".join(self.separator + text for v, text in self._segments if v > version)
+        return {"reset": False, "text": appended, "length": length}
+
+    def _archive(self, texts):
+        if not self.archive_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.archive_path), exist_ok=True)
+            with open(self.archive_path, 'a') as f:
+                f.write(self.separator.join(texts) + self.separator)
+        except Exception as e:
+            print(f"Error archiving log segments: {e}")
+
+
+class AgentState:
+    """Versioned, lock-protected agent state with append-only logs."""
+
+    def __init__(self, fields, logs):
+        self._lock = threading.RLock()
+        self._version = 0
+        self._fields = dict(fields)
+        self._field_versions = {key: 0 for key in fields}
+        self._logs = logs
+
+    @property
+    def version(self):
+        return self._version
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._logs:
+                return self._logs[key].text()
+            return self._fields[key]
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._logs:
+                return self._logs[key].text()
+            return self._fields.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._version += 1
+            if key in self._logs:
+                self._logs[key].reset(value, self._version)
+            else:
+                self._fields[key] = value
+                self._field_versions[key] = self._version
+            return self._version
+
+    def update(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self.set(key, value)
+            return self._version
+
+    def append(self, key, text):
+        """Appends a segment to one of the logs."""
+        with self._lock:
+            self._version += 1
+            self._logs[key].append(text, self._version)
+            return self._version
+
+    def snapshot(self, keys=None):
+        """Returns a consistent copy of the state, with log text, plus its version."""
+        with self._lock:
+            keys = keys or list(self._fields) + list(self._logs)
+            data = {key: self.get(key) for key in keys}
+            data["version"] = self._version
+            return data
+
+    def changes_since(self, version, keys=None):
+        """Returns the fields changed and the log content appended since `version`."""
+        with self._lock:
+            fields = {
+                key: value for key, value in self._fields.items()
+                if self._field_versions[key] > version and (keys is None or key in keys)
+            }
+            logs = {key: log.since(version) for key, log in self._logs.items() if keys is None or key in keys}
+            return {"version": self._version, "fields": fields, "logs": logs}
@@ -0,0 +1,103 @@
+# backend/streaming.py
+
+import queue
+import threading
+
+# --- SSE Streaming Helpers ---
+# Open streams are tracked so shutdown can drain them, and every stream is relayed
+# through a bounded buffer so a slow client pushes back on the model stream instead
+# of letting chunks pile up in memory.
+
+SSE_BUFFER_SIZE = 64
+_END = object()
+
+
+class StreamRegistry:
+    """Tracks open SSE streams so the server can drain them before shutting down."""
+
+    def __init__(self):
+        self._active = 0
+        self._condition = threading.Condition()
+        self.shutting_down = threading.Event()
+
+    @property
+    def active(self):
+        return self._active
+
+    def open(self) -> bool:
+        """Registers a new stream. Returns False once shutdown has begun."""
+        with self._condition:
+            if self.shutting_down.is_set():
+                return False
+            self._active += 1
+            return True
+
+    def close(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def drain(self, timeout=None) -> bool:
+        """Stops accepting new streams and waits for open ones to finish."""
+        self.shutting_down.set()
+        with self._condition:
+            return self._condition.wait_for(lambda: self._active == 0, timeout)
+
+
+def buffered_stream(events, registry, max_buffered=SSE_BUFFER_SIZE):
+    """
+    Relays SSE `events` to the client through a bounded buffer.
+    The source is consumed in a background thread (a greenlet under gevent) that blocks
+    once `max_buffered` events are waiting, and events that are ready together are
+    coalesced into a single write.
+    """
+    if not registry.open():
+        yield 'data: {"error": "Server is shutting down."}\n\n'
+        return
+
+    buffer = queue.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for event in events:
+                if not put(event):
+                    break
+        except Exception as e:
+            print(f"Error producing SSE stream: {e}")
+        finally:
+            if hasattr(events, 'close'):
+                events.close()
+            put(_END)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            batch = [buffer.get()]
+            while True:
+                try:
+                    batch.append(buffer.get_nowait())
+                except queue.Empty:
+                    break
+            finished = batch[-1] is _END
+            if finished:
+                batch.pop()
+            if batch:
+                yield "".join(batch)
+            if finished:
+                return
+    finally:
+        # Also runs when the client disconnects, which releases a blocked producer.
+        stop.set()
+        registry.close()
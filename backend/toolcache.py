@@ -0,0 +1,126 @@
+# backend/toolcache.py
+
+import os
+from .patching import PatchError, parse_unified_diff
+
+# --- Tool Result Cache ---
+# Within a run the agent often re-reads files and re-lists directories it has already
+# seen. Results of read-only tools are cached per run, keyed by their arguments, and
+# dropped as soon as a tool touches a path they depend on. A repeated call then gets a
+# short pointer to the earlier identical call instead of the full payload. Failed calls
+# (results starting with "Error") are never cached.
+
+# Read-only tools, mapped to the argument naming the path their result depends on.
+CACHEABLE_TOOLS = {
+    "read_file": "filepath",
+    "list_files": "path",
+    "generate_project_blueprint": "target_directory",
+}
+
+# Tools that run arbitrary code in or against the workspace; their effects are unknown,
+# so they invalidate everything under the workspace.
+WORKSPACE_WIDE_TOOLS = {"run_tests", "debug_script", "rollback"}
+
+# Tools whose effects on the file system can't be bounded at all.
+GLOBAL_TOOLS = {"execute_git_command"}
+
+
+def touched_paths(tool_name, args, workspace="workspace"):
+    """
+    Returns the (project-relative) paths a tool call may modify: an empty list for
+    tools without side effects on files, or None when anything may have changed.
+    """
+    if tool_name in ("write_file", "delete_file"):
+        return [args.get("filepath", "")]
+    if tool_name == "create_directory":
+        return [args.get("path", "")]
+    if tool_name == "rename_file":
+        return [args.get("old_filepath", ""), args.get("new_filepath", "")]
+    if tool_name == "edit_files":
+        return [edit.get("filepath", "") for edit in args.get("edits") or []]
+    if tool_name == "apply_patch":
+        try:
+            file_patches = parse_unified_diff(args.get("patch", ""))
+        except PatchError:
+            return []
+        return [path for patch in file_patches for path in (patch["old_path"], patch["new_path"]) if path]
+    if tool_name == "execute_python_code":
+        # The sandbox only mounts the code file, which lives in the workspace while it runs.
+        return [os.path.join(workspace, "temp_code.py")]
+    if tool_name in WORKSPACE_WIDE_TOOLS:
+        return [workspace]
+    if tool_name in GLOBAL_TOOLS:
+        return None
+    return []
+
+
+class ToolResultCache:
+    """Per-run cache of read-only tool results with path-based invalidation."""
+
+    def __init__(self, root, workspace="workspace"):
+        self.root = root
+        self.workspace = workspace
+        self._entries = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "chars_saved": 0}
+
+    def lookup(self, tool_name, args):
+        """Returns a short "unchanged" response if the result is cached, else None."""
+        if tool_name not in CACHEABLE_TOOLS:
+            return None
+        entry = self._entries.get(self._key(tool_name, args))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.stats["chars_saved"] += max(len(entry["output"]) - len(entry["response"]), 0)
+        return entry["response"]
+
+    def record(self, tool_name, args, output):
+        """
+        Records a completed tool call: drops the entries whose paths it may have touched
+        and caches its result if it is read-only. Pass `output=None` for calls that failed.
+        """
+        paths = touched_paths(tool_name, args, self.workspace)
+        if paths is None:
+            self.clear()
+        elif paths:
+            self.invalidate(paths)
+
+        if tool_name not in CACHEABLE_TOOLS or output is None or str(output).startswith("Error"):
+            return
+        argument = CACHEABLE_TOOLS[tool_name]
+        path = args.get(argument, "")
+        call = f"{tool_name}({argument}={path!r})"
+        self._entries[self._key(tool_name, args)] = {
+            "path": self._normalize(path),
+            "output": str(output),
+            "response": (f"Unchanged: nothing has modified '{path}' since your earlier {call} call, "
+                         f"so its result above is still current."),
+        }
+
+    def invalidate(self, paths):
+        """Drops entries for any path that contains, or is contained in, one of `paths`."""
+        targets = [self._normalize(path) for path in paths]
+        stale = [
+            key for key, entry in self._entries.items()
+            if any(_overlaps(entry["path"], target) for target in targets)
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.stats["invalidations"] += len(stale)
+
+    def clear(self):
+        self.stats["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def _normalize(self, path):
+        return os.path.normpath(os.path.join(self.root, path or "."))
+
+    def _key(self, tool_name, args):
+        # Keyed by the normalized path, so "src/a.py" and "./src/a.py" share an entry.
+        return tool_name, self._normalize(args.get(CACHEABLE_TOOLS[tool_name], ""))
+
+
+def _overlaps(a, b):
+    """True if `a` and `b` are the same path or one is inside the other."""
+    return os.path.commonpath([a, b]) in (a, b)
@@ -5,15 +5,24 @@ import docker
 from google.generativeai.protos import FunctionDeclaration, Tool, Schema, Type
 import requests
 import json
-import datetime
 import google.generativeai as genai
 import git
 import subprocess
+import time
+import shutil
+import tempfile
+from .checkpoints import CheckpointStore
+from .knowledge import KnowledgeStore
+from .patching import PatchError, apply_search_replace, apply_line_range, parse_unified_diff, apply_hunks, summarize_change
+from .toolcache import touched_paths
+from .workers import WorkerPool, WorkerError, WorkerTimeout, WORKER_POOL_ENABLED
 
 # --- Pathing and Safeguards ---
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 knowledge_base_path = os.path.join(project_root, 'backend', 'knowledge_base.md')
+knowledge_store_path = os.path.join(project_root, 'backend', 'knowledge.json')
 workspace_path = os.path.join(project_root, 'workspace')
+checkpoint_store_path = os.path.join(project_root, '.checkpoints')
 
 PROTECTED_PATHS = [
     os.path.normpath(os.path.join(project_root, 'backend')),
@@ -23,8 +32,12 @@ PROTECTED_PATHS = [
     os.path.normpath(os.path.join(project_root, 'Dockerfile.sandbox')),
     os.path.normpath(os.path.join(project_root, 'setup.sh')),
     os.path.normpath(os.path.join(project_root, 'requirements.txt')),
+    os.path.normpath(checkpoint_store_path),
 ]
 
+# Tools that modify the workspace; the agent checkpoints it before each call.
+DESTRUCTIVE_TOOLS = {"write_file", "edit_files", "apply_patch", "delete_file", "rename_file"}
+
 def is_protected(path: str) -> bool:
     """Checks if a path is within a protected directory."""
     normalized_path = os.path.normpath(path)
@@ -46,7 +59,8 @@ def read_file(filepath: str) -> str:
         with open(safe_path, 'r') as f:
             return f.read()
     except Exception as e:
-        return str(e)
+        # The "Error:" prefix marks the result as a failure, e.g. so it isn't cached.
+        return f"Error: {e}"
 
 def write_file(filepath: str, content: str) -> str:
     """Writes content to a file, if not protected."""
@@ -65,6 +79,8 @@ def list_files(path: str) -> str:
     """Lists the files in a directory recursively and returns a JSON tree."""
     try:
         safe_path = get_safe_path(path)
+        if not os.path.isdir(safe_path):
+            return f"Error: Directory '{path}' does not exist."
         tree = {}
         for root, dirs, files in os.walk(safe_path):
             current_level = tree
@@ -81,7 +97,7 @@ def list_files(path: str) -> str:
         return json.dumps(tree, indent=2)
 
     except Exception as e:
-        return str(e)
+        return f"Error: {e}"
 
 def create_directory(path: str) -> str:
     """Creates a new directory, if not protected."""
@@ -117,6 +133,107 @@ def rename_file(old_filepath: str, new_filepath: str) -> str:
     except Exception as e:
         return str(e)
 
+def atomic_write(safe_path: str, content: str):
+    """Writes a file via a temporary file and rename, so it is never left half-written."""
+    directory = os.path.dirname(safe_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        if os.path.exists(safe_path):
+            shutil.copymode(safe_path, tmp_path)
+        os.replace(tmp_path, safe_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_file_changes(originals: dict, updated: dict) -> str:
+    """Writes validated edits (None deletes a file) and returns a compact diff summary."""
+    summaries = []
+    for filepath, content in updated.items():
+        if content is None:
+            os.remove(get_safe_path(filepath))
+            summaries.append(f"{filepath}: deleted")
+        elif content != originals.get(filepath) or not os.path.exists(get_safe_path(filepath)):
+            atomic_write(get_safe_path(filepath), content)
+            summaries.append(summarize_change(filepath, originals.get(filepath) or "", content))
+    return "\n".join(summaries) if summaries else "No changes."
+
+def edit_files(edits: list) -> str:
+    """
+    Applies search/replace or line-range edits to one or more files. Every edit is
+    validated before any file is written, so either all edits apply or none do.
+    """
+    try:
+        originals, updated = {}, {}
+        for number, edit in enumerate(edits, 1):
+            filepath = edit.get("filepath")
+            if not filepath:
+                return f"Error: Edit {number} is missing 'filepath'."
+            if is_protected(get_safe_path(filepath)):
+                return "Error: Permission Denied. Cannot edit a protected system file."
+            if filepath not in updated:
+                with open(get_safe_path(filepath), 'r') as f:
+                    originals[filepath] = updated[filepath] = f.read()
+            try:
+                if "search" in edit:
+                    updated[filepath] = apply_search_replace(updated[filepath], edit["search"], edit.get("replace", ""))
+                elif "start_line" in edit:
+                    updated[filepath] = apply_line_range(
+                        updated[filepath], edit["start_line"], edit.get("end_line", edit["start_line"]),
+                        edit.get("content", ""), edit.get("expected"),
+                    )
+                else:
+                    return f"Error: Edit {number} needs either 'search' or 'start_line'."
+            except PatchError as e:
+                return f"Error: Edit {number} to '{filepath}' does not apply: {e} No files were changed."
+        return write_file_changes(originals, updated)
+    except Exception as e:
+        return str(e)
+
+def apply_patch(patch: str) -> str:
+    """
+    Applies a unified diff, which may span several files, including creations,
+    deletions and renames. Every hunk is validated before any file is written.
+    """
+    try:
+        file_patches = parse_unified_diff(patch)
+        originals, updated = {}, {}
+        for file_patch in file_patches:
+            old_path, new_path = file_patch["old_path"], file_patch["new_path"]
+            for path in (old_path, new_path):
+                if path and is_protected(get_safe_path(path)):
+                    return "Error: Permission Denied. Cannot patch a protected system file."
+
+            # Creations and rename targets must not overwrite a file the patch didn't account for.
+            if new_path and new_path != old_path and os.path.exists(get_safe_path(new_path)) and updated.get(new_path, "") is not None:
+                return f"Error: Patch creates '{new_path}', which already exists. No files were changed."
+
+            old_text = ""
+            if old_path:
+                if old_path not in updated:
+                    with open(get_safe_path(old_path), 'r') as f:
+                        originals[old_path] = updated[old_path] = f.read()
+                old_text = updated[old_path]
+            try:
+                new_text = apply_hunks(old_text, file_patch["hunks"])
+            except PatchError as e:
+                return f"Error: Patch for '{new_path or old_path}' does not apply: {e} No files were changed."
+
+            if old_path and old_path != new_path:
+                updated[old_path] = None
+            if new_path:
+                # A renamed file is summarized against its old content.
+                originals.setdefault(new_path, old_text if old_path else None)
+                updated[new_path] = new_text
+        return write_file_changes(originals, updated)
+    except PatchError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return str(e)
+
 def execute_python_code(code: str) -> str:
     """Executes Python code in a sandboxed Docker container."""
     from .app import docker_image, docker_client
@@ -144,6 +261,28 @@ def execute_python_code(code: str) -> str:
         if os.path.exists(temp_code_path):
             os.remove(temp_code_path)
 
+worker_pool = WorkerPool(project_root, workspace_path)
+
+def run_in_worker_pool(job: dict, timeout: int):
+    """Runs a pytest or pdb job in a warm worker. Returns None if the cold path should be used instead."""
+    if not WORKER_POOL_ENABLED:
+        return None
+    try:
+        return worker_pool.run(job, timeout)
+    except WorkerTimeout:
+        raise
+    except WorkerError as e:
+        print(f"Worker pool unavailable, falling back to a subprocess: {e}")
+        return None
+
+def run_cold_subprocess(command: list, timeout: int, input: str = None):
+    """Runs a job in a fresh interpreter, recording its time as the cold baseline."""
+    start = time.perf_counter()
+    process = subprocess.run(command, input=input, capture_output=True, text=True, timeout=timeout)
+    seconds = time.perf_counter() - start
+    worker_pool.record(seconds, cold=True)
+    return {"stdout": process.stdout, "stderr": process.stderr, "seconds": seconds, "cold": True}
+
 def run_tests(test_directory: str) -> str:
     """Runs pytest on a specified directory within the workspace."""
     safe_path = get_safe_path(test_directory)
@@ -151,13 +290,11 @@ def run_tests(test_directory: str) -> str:
         return "Error: Can only run tests within the workspace."
 
     try:
-        process = subprocess.run(
-            ['python3', '-m', 'pytest', safe_path],
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-        return f"Test Results:\nSTDOUT:\n{process.stdout}\nSTDERR:\n{process.stderr}"
+        result = run_in_worker_pool({"kind": "pytest", "path": safe_path}, timeout=120)
+        if result is None:
+            result = run_cold_subprocess(['python3', '-m', 'pytest', safe_path], timeout=120)
+        return (f"Test Results:\nSTDOUT:\n{result['stdout']}\nSTDERR:\n{result['stderr']}\n"
+                f"{worker_pool.describe(result['seconds'], result['cold'])}")
     except Exception as e:
         return str(e)
 
@@ -169,19 +306,25 @@ def debug_script(filepath: str, commands: list[str]) -> str:
         return "Error: Can only debug a script within the workspace."
 
     try:
-        debugger_commands = "\n".join(commands)
-        process = subprocess.run(
-            ['python3', '-m', 'pdb', safe_path],
-            input=debugger_commands,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return f"Debugger Output:\nSTDOUT:\n{process.stdout}\nSTDERR:\n{process.stderr}"
+        commands = list(commands)
+        result = run_in_worker_pool({"kind": "pdb", "path": safe_path, "commands": commands}, timeout=30)
+        if result is None:
+            result = run_cold_subprocess(['python3', '-m', 'pdb', safe_path], timeout=30, input="\n".join(commands))
+        return (f"Debugger Output:\nSTDOUT:\n{result['stdout']}\nSTDERR:\n{result['stderr']}\n"
+                f"{worker_pool.describe(result['seconds'], result['cold'])}")
     except Exception as e:
         return str(e)
 
 
+git_repo = None
+
+def get_git_repo():
+    """Returns a persistent handle to the project's Git repository."""
+    global git_repo
+    if git_repo is None:
+        git_repo = git.Repo(project_root)
+    return git_repo
+
 def execute_git_command(command: str) -> str:
     """Executes a whitelisted Git command."""
     allowed_commands = ['status', 'diff', 'add', 'commit', 'branch', 'push']
@@ -191,7 +334,7 @@ def execute_git_command(command: str) -> str:
         return f"Error: Git command '{command_parts[0]}' is not allowed."
 
     try:
-        repo = git.Repo(project_root)
+        repo = get_git_repo()
         if command_parts[0] == 'commit' and '-m' in command_parts:
             msg_index = command_parts.index('-m') + 1
             if msg_index < len(command_parts):
@@ -202,6 +345,63 @@ def execute_git_command(command: str) -> str:
     except Exception as e:
         return str(e)
 
+checkpoint_store = CheckpointStore(workspace_path, checkpoint_store_path)
+
+def checkpoint(label: str = "") -> str:
+    """Snapshots the workspace so it can be restored later with `rollback`."""
+    try:
+        start = time.perf_counter()
+        checkpoint_id = checkpoint_store.checkpoint(label)
+        return f"Checkpoint '{checkpoint_id}' created in {(time.perf_counter() - start) * 1000:.1f} ms."
+    except Exception as e:
+        return str(e)
+
+def auto_checkpoint(tool_name: str, args: dict):
+    """
+    Checkpoints the workspace before a destructive tool call. Checkpoints only cover the
+    workspace, so a call touching paths outside it gets no checkpoint; a note saying so
+    is returned for the tool output instead. Returns None otherwise.
+    """
+    outside = [
+        path for path in touched_paths(tool_name, args) or []
+        if path and os.path.commonpath([get_safe_path(path), workspace_path]) != workspace_path
+    ]
+    if outside:
+        return (f"Note: no checkpoint was taken before this call because {', '.join(outside)} "
+                f"is outside the workspace; rollback cannot undo it.")
+    target = args.get("filepath") or args.get("old_filepath") or ""
+    checkpoint_store.checkpoint(f"before {tool_name} {target}".strip(), auto=True)
+    return None
+
+def list_checkpoints() -> str:
+    """Lists the available workspace checkpoints, oldest first."""
+    try:
+        return json.dumps(checkpoint_store.list_checkpoints(), indent=2)
+    except Exception as e:
+        return str(e)
+
+def diff_since(checkpoint_id: str) -> str:
+    """Summarizes workspace changes since a checkpoint, with diffs of modified files."""
+    try:
+        changes = checkpoint_store.diff_since(checkpoint_id)
+        if not any(changes.values()):
+            return f"No changes since checkpoint '{checkpoint_id}'."
+        summary = "\n".join(f"{kind.capitalize()}: {', '.join(paths)}" for kind, paths in changes.items() if paths)
+        diffs = "".join(checkpoint_store.unified_diff(checkpoint_id, rel) for rel in changes["modified"])
+        return f"{summary}\n\n{diffs}" if diffs else summary
+    except Exception as e:
+        return str(e)
+
+def rollback(checkpoint_id: str) -> str:
+    """Restores the workspace to a checkpoint."""
+    try:
+        start = time.perf_counter()
+        result = checkpoint_store.rollback(checkpoint_id)
+        return (f"Rolled back to '{checkpoint_id}' in {(time.perf_counter() - start) * 1000:.1f} ms: "
+                f"{result['restored']} files restored, {result['removed']} removed.")
+    except Exception as e:
+        return str(e)
+
 def web_search(query: str) -> str:
     """Performs a web search using the Tavily API."""
     try:
@@ -217,12 +417,22 @@ def web_search(query: str) -> str:
     except Exception as e:
         return str(e)
 
+def query_codebase(query: str) -> str:
+    """Semantically searches the indexed codebase and knowledge base."""
+    try:
+        from .rag import query_codebase as rag_query_codebase
+        return rag_query_codebase(query)
+    except Exception as e:
+        return str(e)
+
+knowledge_store = KnowledgeStore(knowledge_store_path, legacy_markdown_path=knowledge_base_path)
+
 def record_learning(learning: str) -> str:
     """Records a key learning to the agent's long-term knowledge base."""
     try:
-        with open(knowledge_base_path, 'a') as f:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"\n---\n**Learning recorded at {timestamp}:**\n{learning}\n")
+        result = knowledge_store.add(learning)
+        if result == "merged":
+            return "Learning merged with a similar existing learning."
         return "Learning recorded successfully."
     except Exception as e:
         return str(e)
@@ -271,7 +481,8 @@ def generate_project_blueprint(target_directory: str) -> str:
         )
 
         blueprint = response.text
-        record_learning(f"Project Blueprint for {target_directory}:\n{blueprint}")
+        # One blueprint per directory; regenerating it replaces the previous one.
+        knowledge_store.add(f"Project Blueprint for {target_directory}:\n{blueprint}", kind="blueprint", key=f"blueprint:{os.path.normpath(target_directory)}")
         return f"Project blueprint generated and saved to knowledge base."
 
     except Exception as e:
@@ -288,6 +499,8 @@ def finish_task() -> str:
 tools = [
     FunctionDeclaration(name="read_file", description="Reads the content of a file.", parameters=Schema(type=Type.OBJECT, properties={"filepath": Schema(type=Type.STRING)}, required=["filepath"])),
     FunctionDeclaration(name="write_file", description="Writes content to a file in the workspace.", parameters=Schema(type=Type.OBJECT, properties={"filepath": Schema(type=Type.STRING), "content": Schema(type=Type.STRING)}, required=["filepath", "content"])),
+    FunctionDeclaration(name="edit_files", description="Edits one or more files without rewriting them. Each edit has a filepath plus either search/replace (search must match exactly once) or start_line/end_line/content (1-based, inclusive; optional expected text of the replaced lines). All edits apply or none do. Prefer this over write_file for changes to existing files.", parameters=Schema(type=Type.OBJECT, properties={"edits": Schema(type=Type.ARRAY, items=Schema(type=Type.OBJECT, properties={"filepath": Schema(type=Type.STRING), "search": Schema(type=Type.STRING), "replace": Schema(type=Type.STRING), "start_line": Schema(type=Type.INTEGER), "end_line": Schema(type=Type.INTEGER), "content": Schema(type=Type.STRING), "expected": Schema(type=Type.STRING)}, required=["filepath"]))}, required=["edits"])),
+    FunctionDeclaration(name="apply_patch", description="Applies a unified diff, which may span several files. Context lines must match the current files.", parameters=Schema(type=Type.OBJECT, properties={"patch": Schema(type=Type.STRING)}, required=["patch"])),
     FunctionDeclaration(name="list_files", description="Lists the files in a directory recursively.", parameters=Schema(type=Type.OBJECT, properties={"path": Schema(type=Type.STRING)}, required=["path"])),
     FunctionDeclaration(name="create_directory", description="Creates a new directory in the workspace.", parameters=Schema(type=Type.OBJECT, properties={"path": Schema(type=Type.STRING)}, required=["path"])),
     FunctionDeclaration(name="delete_file", description="Deletes a file in the workspace.", parameters=Schema(type=Type.OBJECT, properties={"filepath": Schema(type=Type.STRING)}, required=["filepath"])),
@@ -296,7 +509,12 @@ tools = [
     FunctionDeclaration(name="run_tests", description="Runs pytest on a specified directory.", parameters=Schema(type=Type.OBJECT, properties={"test_directory": Schema(type=Type.STRING)}, required=["test_directory"])),
     FunctionDeclaration(name="debug_script", description="Executes a Python script with the pdb debugger and a list of commands.", parameters=Schema(type=Type.OBJECT, properties={"filepath": Schema(type=Type.STRING), "commands": Schema(type=Type.ARRAY, items=Schema(type=Type.STRING))}, required=["filepath", "commands"])),
     FunctionDeclaration(name="execute_git_command", description="Executes a whitelisted Git command.", parameters=Schema(type=Type.OBJECT, properties={"command": Schema(type=Type.STRING)}, required=["command"])),
+    FunctionDeclaration(name="checkpoint", description="Snapshots the workspace so it can be restored later with rollback. Checkpoints are also taken automatically before write_file, edit_files, apply_patch, delete_file and rename_file when they only touch the workspace.", parameters=Schema(type=Type.OBJECT, properties={"label": Schema(type=Type.STRING)})),
+    FunctionDeclaration(name="list_checkpoints", description="Lists the available workspace checkpoints, oldest first.", parameters=Schema(type=Type.OBJECT, properties={})),
+    FunctionDeclaration(name="diff_since", description="Shows the workspace changes since a checkpoint.", parameters=Schema(type=Type.OBJECT, properties={"checkpoint_id": Schema(type=Type.STRING)}, required=["checkpoint_id"])),
+    FunctionDeclaration(name="rollback", description="Restores the workspace to a checkpoint in a single step.", parameters=Schema(type=Type.OBJECT, properties={"checkpoint_id": Schema(type=Type.STRING)}, required=["checkpoint_id"])),
     FunctionDeclaration(name="web_search", description="Performs a web search.", parameters=Schema(type=Type.OBJECT, properties={"query": Schema(type=Type.STRING)}, required=["query"])),
+    FunctionDeclaration(name="query_codebase", description="Semantically searches the indexed codebase for snippets relevant to a query.", parameters=Schema(type=Type.OBJECT, properties={"query": Schema(type=Type.STRING)}, required=["query"])),
     FunctionDeclaration(name="record_learning", description="Records a key learning to the agent's long-term knowledge base.", parameters=Schema(type=Type.OBJECT, properties={"learning": Schema(type=Type.STRING)}, required=["learning"])),
     FunctionDeclaration(name="request_confirmation", description="Asks the user for confirmation before a critical action.", parameters=Schema(type=Type.OBJECT, properties={"prompt": Schema(type=Type.STRING)}, required=["prompt"])),
     FunctionDeclaration(name="generate_project_blueprint", description="Analyzes a directory to generate a high-level project blueprint.", parameters=Schema(type=Type.OBJECT, properties={"target_directory": Schema(type=Type.STRING)}, required=["target_directory"])),
@@ -305,5 +523,5 @@ tools = [
 
 tool_config = Tool(function_declarations=tools)
 tool_map = {
-    "read_file": read_file, "write_file": write_file, "list_files": list_files, "create_directory": create_directory, "delete_file": delete_file, "rename_file": rename_file, "execute_python_code": execute_python_code, "run_tests": run_tests, "debug_script": debug_script, "execute_git_command": execute_git_command, "web_search": web_search, "record_learning": record_learning, "request_confirmation": request_confirmation, "generate_project_blueprint": generate_project_blueprint, "finish_task": finish_task,
+    "read_file": read_file, "write_file": write_file, "edit_files": edit_files, "apply_patch": apply_patch, "list_files": list_files, "create_directory": create_directory, "delete_file": delete_file, "rename_file": rename_file, "execute_python_code": execute_python_code, "run_tests": run_tests, "debug_script": debug_script, "execute_git_command": execute_git_command, "checkpoint": checkpoint, "list_checkpoints": list_checkpoints, "diff_since": diff_since, "rollback": rollback, "web_search": web_search, "query_codebase": query_codebase, "record_learning": record_learning, "request_confirmation": request_confirmation, "generate_project_blueprint": generate_project_blueprint, "finish_task": finish_task,
 }
@@ -0,0 +1,328 @@
+# backend/workers.py
+
+import io
+import os
+import re
+import sys
+import ast
+import time
+import socket
+import threading
+import importlib
+import traceback
+import subprocess
+import contextlib
+from multiprocessing.connection import Connection
+
+# --- Test and Debug Worker Pool ---
+# `run_tests` and `debug_script` used to start a fresh interpreter for every call,
+# paying for interpreter startup, plugin discovery and imports of the code under test
+# each TDD iteration. Long-lived workers keep those imports warm and take jobs over a
+# socket pair. Before each job a worker drops only the workspace modules whose files
+# changed (and the workspace modules importing them). Workers that time out, crash or
+# may have been left in a bad state are replaced.
+
+WORKER_POOL_ENABLED = os.environ.get("TEST_WORKER_POOL", "1") == "1"
+WORKER_POOL_SIZE = int(os.environ.get("TEST_WORKER_POOL_SIZE", 2))
+WORKER_MAX_JOBS = int(os.environ.get("TEST_WORKER_MAX_JOBS", 50))
+WORKER_MAX_RSS_MB = int(os.environ.get("TEST_WORKER_MAX_RSS_MB", 1024))
+
+TEST_MODULE_PATTERN = re.compile(r"^(test_.*|.*_test|conftest)\.py$")
+
+
+class WorkerError(Exception):
+    """Raised when a worker exits or fails before returning a result."""
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when a job runs past its timeout; the worker is killed."""
+
+
+# --- Worker side ---
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def module_imports(path, module_name, is_package=False):
+    """Returns the absolute names of the modules imported by the source file at `path`."""
+    try:
+        with open(path, 'r') as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    package = module_name if is_package else module_name.rpartition(".")[0]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split(".") if package else []
+                base = ".".join(parts[:len(parts) - node.level + 1])
+                module = f"{base}.{node.module}".strip(".") if node.module else base
+            else:
+                module = node.module
+            if not module:
+                continue
+            names.add(module)
+            names.update(f"{module}.{alias.name}" for alias in node.names)
+    return names
+
+
+class ModuleTracker:
+    """Tracks the workspace modules loaded in a worker and drops the stale ones."""
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root) + os.sep
+        self._loaded = {}  # module name -> (path, stamp, imported names)
+
+    def track(self):
+        """Records newly imported workspace modules with their file stamps."""
+        for name, path, module in self._workspace_modules():
+            if name not in self._loaded:
+                is_package = hasattr(module, "__path__")
+                self._loaded[name] = (path, _stamp(path), module_imports(path, name, is_package))
+
+    def purge_changed(self):
+        """
+        Removes changed workspace modules from sys.modules, along with their submodules
+        and every workspace module that imports them. Returns the removed names.
+        """
+        stale = {name for name, (path, stamp, _) in self._loaded.items() if _stamp(path) != stamp}
+        while stale:
+            dependents = {
+                name for name, (_, _, imports) in self._loaded.items()
+                if name not in stale and (
+                    any(name.startswith(f"{s}.") for s in stale)
+                    or any(i == s or i.startswith(f"{s}.") for i in imports for s in stale)
+                )
+            }
+            if not dependents:
+                break
+            stale |= dependents
+        self._remove(stale)
+        importlib.invalidate_caches()
+        return stale
+
+    def purge_test_modules(self):
+        """Drops test modules and conftests, which pytest imports under short names that can clash between runs."""
+        self._remove({
+            name for name, path, _ in self._workspace_modules()
+            if TEST_MODULE_PATTERN.match(os.path.basename(path))
+        })
+
+    def _remove(self, names):
+        for name in names:
+            sys.modules.pop(name, None)
+            self._loaded.pop(name, None)
+
+    def _workspace_modules(self):
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if path and os.path.realpath(path).startswith(self.root):
+                yield name, path, module
+
+
+def run_pytest_job(path):
+    import pytest
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        pytest.main([path])
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def run_debug_job(path, commands):
+    """Runs a script under pdb, feeding it `commands` the way `python -m pdb` reads stdin."""
+    import pdb
+    stdout, stderr = io.StringIO(), io.StringIO()
+    debugger = pdb.Pdb(stdin=io.StringIO("\n".join(commands) + "\n"), stdout=stdout)
+    with open(path, 'r') as f:
+        code = compile(f.read(), path, "exec")
+    sys.argv = [path]
+    sys.path.insert(0, os.path.dirname(path))
+    script_globals = {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__}
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            debugger.run(code, script_globals)
+        except (SystemExit, pdb.bdb.BdbQuit):
+            pass
+        except Exception as e:
+            traceback.print_exc(file=stdout)
+            stdout.write("Uncaught exception. Entering post mortem debugging\n")
+            debugger.reset()
+            debugger.interaction(None, e.__traceback__)
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def _rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0
+
+
+def serve(fd, workspace):
+    """Worker main loop: runs jobs received on `fd` until the pool closes the connection."""
+    import pytest, pdb  # noqa: F401 - imported up front so the first job starts warm
+    conn = Connection(fd)
+    tracker = ModuleTracker(workspace)
+    baseline_threads = threading.active_count()
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        tracker.purge_changed()
+        cwd, path, argv, environ = os.getcwd(), list(sys.path), list(sys.argv), dict(os.environ)
+        result = {"stdout": "", "stderr": "", "dirty": None}
+        try:
+            if job["kind"] == "pytest":
+                result["stdout"], result["stderr"] = run_pytest_job(job["path"])
+            else:
+                result["stdout"], result["stderr"] = run_debug_job(job["path"], job["commands"])
+        except BaseException:
+            result["stderr"] += traceback.format_exc()
+            result["dirty"] = "job raised in the worker"
+        finally:
+            # Undo process-wide changes a job may have made before the next one runs.
+            os.chdir(cwd)
+            sys.path[:], sys.argv[:] = path, argv
+            os.environ.clear()
+            os.environ.update(environ)
+
+        tracker.track()
+        tracker.purge_test_modules()
+        if threading.active_count() > baseline_threads:
+            result["dirty"] = "threads left running"
+        elif _rss_mb() > WORKER_MAX_RSS_MB:
+            result["dirty"] = "memory limit"
+        conn.send(result)
+
+
+# --- Pool side ---
+
+class Worker:
+    """A worker process and the parent's end of its connection."""
+
+    def __init__(self, root, workspace):
+        parent_sock, child_sock = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "backend.workers", str(child_sock.fileno()), workspace],
+            cwd=root, pass_fds=[child_sock.fileno()],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        )
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.started = time.perf_counter()
+        self.jobs = 0
+
+    def run(self, job, timeout):
+        try:
+            self.conn.send(job)
+            if not self.conn.poll(timeout):
+                raise WorkerTimeout(f"Job timed out after {timeout} seconds.")
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"Worker exited unexpectedly (exit code {self.process.poll()}).") from e
+
+    def close(self):
+        self.conn.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class WorkerPool:
+    """
+    Runs pytest and pdb jobs in long-lived worker processes, started on first use.
+    Timings of the first job on each new worker (including its startup) and of cold
+    subprocess runs are recorded as the cold baseline that warm runs are compared to.
+    """
+
+    def __init__(self, root, workspace, size=WORKER_POOL_SIZE, max_jobs=WORKER_MAX_JOBS):
+        self.root = root
+        self.workspace = workspace
+        self.max_jobs = max_jobs
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self.stats = {
+            "cold_runs": 0, "cold_seconds": 0.0, "warm_runs": 0, "warm_seconds": 0.0,
+            "recycled": 0, "recycle_reasons": {},
+        }
+
+    def run(self, job, timeout):
+        """Runs a job, returning {"stdout", "stderr", "seconds", "cold"}."""
+        with self._slots:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else Worker(self.root, self.workspace)
+            cold = worker.jobs == 0
+            start = worker.started if cold else time.perf_counter()
+            try:
+                result = worker.run(job, timeout)
+            except WorkerTimeout:
+                self._recycle(worker, "timeout")
+                raise
+            except WorkerError:
+                self._recycle(worker, "worker exited")
+                raise
+            worker.jobs += 1
+            result["seconds"] = time.perf_counter() - start
+            result["cold"] = cold
+            self.record(result["seconds"], cold)
+
+            reason = result.pop("dirty") or (worker.jobs >= self.max_jobs and "job limit")
+            if reason:
+                self._recycle(worker, reason)
+            else:
+                with self._lock:
+                    self._idle.append(worker)
+            return result
+
+    def record(self, seconds, cold):
+        kind = "cold" if cold else "warm"
+        with self._lock:
+            self.stats[f"{kind}_runs"] += 1
+            self.stats[f"{kind}_seconds"] += seconds
+
+    def speedup(self):
+        """Average cold time divided by average warm time, or None until both are known."""
+        with self._lock:
+            if not self.stats["cold_runs"] or not self.stats["warm_runs"] or not self.stats["warm_seconds"]:
+                return None
+            cold = self.stats["cold_seconds"] / self.stats["cold_runs"]
+            warm = self.stats["warm_seconds"] / self.stats["warm_runs"]
+            return cold / warm
+
+    def describe(self, seconds, cold):
+        """One-line timing summary appended to tool output."""
+        if cold:
+            return f"Ran in {seconds:.2f}s (cold start)."
+        speedup = self.speedup()
+        if speedup is None:
+            return f"Ran in a warm worker in {seconds:.2f}s."
+        cold_average = self.stats["cold_seconds"] / self.stats["cold_runs"]
+        return f"Ran in a warm worker in {seconds:.2f}s (cold start averages {cold_average:.2f}s; warm runs are {speedup:.1f}x faster)."
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+    def _recycle(self, worker, reason):
+        worker.close()
+        with self._lock:
+            self.stats["recycled"] += 1
+            self.stats["recycle_reasons"][reason] = self.stats["recycle_reasons"].get(reason, 0) + 1
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), sys.argv[2])
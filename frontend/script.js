@@ -23,6 +23,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const mainPlanMd = document.getElementById('main-plan-md');
 
     let conversationHistory = [];
+    let chatSessionId = null;
+    let chatSessionVersion = null;
     let statusInterval;
     const API_BASE_URL = '/';
 
@@ -37,13 +39,16 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         });
 
+    const scratchpadRenderer = createMarkdownRenderer(scratchpadMd);
+    const mainPlanRenderer = createMarkdownRenderer(mainPlanMd);
+
     fetch(`${API_BASE_URL}scratchpad`).then(response => response.text()).then(text => {
         scratchpadTextarea.value = text;
-        scratchpadMd.innerHTML = marked.parse(text);
+        scratchpadRenderer.set(text);
     });
     fetch(`${API_BASE_URL}main_plan`).then(response => response.text()).then(text => {
         mainPlanTextarea.value = text;
-        mainPlanMd.innerHTML = marked.parse(text);
+        mainPlanRenderer.set(text);
     });
 
     sendButton.addEventListener('click', () => {
@@ -73,50 +78,42 @@ document.addEventListener('DOMContentLoaded', () => {
         loadingIndicator.style.display = 'flex';
 
         const modelMessageElement = appendMessage('model', '');
+        const renderer = createMarkdownRenderer(modelMessageElement, scrollChatToBottom);
         let fullResponse = '';
 
         try {
-            const response = await fetch(`${API_BASE_URL}chat`, {
+            const requestBody = {
+                model: model,
+                message: message,
+                session_id: chatSessionId,
+                version: chatSessionVersion
+            };
+            const postChat = (body) => fetch(`${API_BASE_URL}chat`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    model: model,
-                    message: message,
-                    conversation_history: conversationHistory.slice(0, -1)
-                })
+                body: JSON.stringify(body)
             });
 
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-
-            while (true) {
-                const { value, done } = await reader.read();
-                if (done) break;
-
-                const rawSse = decoder.decode(value);
-                const sseMessages = rawSse.split('\\n\\n').filter(Boolean);
-
-                for (const sseMessage of sseMessages) {
-                    if (sseMessage.startsWith('data:')) {
-                        try {
-                            const dataStr = sseMessage.substring(5).trim();
-                            const data = JSON.parse(dataStr);
-                            if (data.chunk) {
-                                fullResponse += data.chunk;
-                                modelMessageElement.innerHTML = marked.parse(fullResponse);
-                                chatHistory.scrollTop = chatHistory.scrollHeight;
-                            } else if (data.history) {
-                                conversationHistory = data.history;
-                                renderHistory();
-                            }
-                        } catch (e) {
-                            console.error('Error parsing SSE data:', e);
-                        }
-                    }
-                }
+            // Only the new message is sent; the full history is resent only if the server asks to resync.
+            let response = await postChat(requestBody);
+            if (response.status === 409) {
+                response = await postChat({ ...requestBody, conversation_history: conversationHistory.slice(0, -1) });
             }
+
+            await readSseStream(response, data => {
+                if (data.chunk) {
+                    fullResponse += data.chunk;
+                    renderer.append(data.chunk);
+                } else if (data.session_id && data.version !== undefined) {
+                    chatSessionId = data.session_id;
+                    chatSessionVersion = data.version;
+                } else if (data.error) {
+                    chatSessionVersion = null;
+                    console.error('Chat error:', data.error);
+                }
+            });
         } catch (error) {
-            modelMessageElement.innerHTML = "Error fetching response.";
+            renderer.set("Error fetching response.");
             console.error('Fetch error:', error);
         } finally {
             loadingIndicator.style.display = 'none';
@@ -124,6 +121,142 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Reads an SSE response body, calling onEvent with each parsed `data:` payload.
+    // A read can end mid-frame (or mid-character), so the incomplete tail is carried
+    // over to the next read instead of being parsed early.
+    async function readSseStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const dispatch = (frame) => {
+            const dataLines = frame.split('\n')
+                .filter(line => line.startsWith('data:'))
+                .map(line => line.substring(5).trim());
+            if (!dataLines.length) return;
+            try {
+                onEvent(JSON.parse(dataLines.join('\n')));
+            } catch (e) {
+                console.error('Error parsing SSE data:', e);
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            frames.forEach(dispatch);
+        }
+        buffer += decoder.decode();
+        if (buffer.trim()) dispatch(buffer);
+    }
+
+    // Returns the offsets just past each blank line after `start` that ends a complete
+    // top-level block: outside any fenced code block, and not followed by a list item or
+    // indented continuation (which would still belong to the block above it).
+    function findStableBoundaries(source, start) {
+        const boundaries = [];
+        let inFence = false;
+        let pos = start;
+        while (true) {
+            const lineEnd = source.indexOf('\n', pos);
+            if (lineEnd === -1) break;
+            const line = source.substring(pos, lineEnd);
+            if (/^ {0,3}(```|~~~)/.test(line)) {
+                inFence = !inFence;
+            } else if (!inFence && line.trim() === '') {
+                // The following line decides whether the block is complete, so it must have arrived in full.
+                const nextEnd = source.indexOf('\n', lineEnd + 1);
+                if (nextEnd === -1) break;
+                const nextLine = source.substring(lineEnd + 1, nextEnd);
+                if (nextLine.trim() !== '' && !/^(\s|[-*+] |\d+[.)] )/.test(nextLine)) {
+                    boundaries.push(lineEnd + 1);
+                }
+            }
+            pos = lineEnd + 1;
+        }
+        return boundaries;
+    }
+
+    // Renders growing markdown into `element` without re-parsing the whole text on every
+    // update. Completed blocks are parsed once and frozen; only the trailing open block is
+    // re-rendered, and updates are batched to at most one DOM write per animation frame.
+    function createMarkdownRenderer(element, onRender) {
+        let source = '';
+        let frozenLength = 0;
+        let frozenBlocks = [];  // {length, node} per frozen block, oldest first
+        let frameRequested = false;
+        const frozen = document.createElement('div');
+        const tail = document.createElement('div');
+
+        const reset = () => {
+            frozenLength = 0;
+            frozenBlocks = [];
+            frozen.innerHTML = '';
+            element.replaceChildren(frozen, tail);
+        };
+
+        const render = () => {
+            frameRequested = false;
+            // Each completed block gets its own node, so trimStart can drop them one by one.
+            findStableBoundaries(source, frozenLength).forEach(boundary => {
+                const node = document.createElement('div');
+                node.innerHTML = marked.parse(source.substring(frozenLength, boundary));
+                frozen.appendChild(node);
+                frozenBlocks.push({ length: boundary - frozenLength, node });
+                frozenLength = boundary;
+            });
+            tail.innerHTML = marked.parse(source.substring(frozenLength));
+            if (onRender) onRender();
+        };
+
+        const scheduleRender = () => {
+            if (!frameRequested) {
+                frameRequested = true;
+                requestAnimationFrame(render);
+            }
+        };
+
+        reset();
+        return {
+            append(text) {
+                if (!text) return;
+                source += text;
+                scheduleRender();
+            },
+            // Replaces the text; content that only grew is treated as an append.
+            set(text) {
+                if (text === source) return;
+                if (text.startsWith(source)) {
+                    source = text;
+                } else {
+                    source = text;
+                    reset();
+                }
+                scheduleRender();
+            },
+            // Drops up to `count` leading characters in whole frozen blocks, so trimming
+            // never re-renders; a partly trimmed block stays until a later trim covers it.
+            trimStart(count) {
+                let dropped = 0;
+                while (frozenBlocks.length && dropped + frozenBlocks[0].length <= count) {
+                    const block = frozenBlocks.shift();
+                    block.node.remove();
+                    dropped += block.length;
+                }
+                source = source.substring(dropped);
+                frozenLength -= dropped;
+            },
+            text: () => source,
+        };
+    }
+
+    function scrollChatToBottom() {
+        chatHistory.scrollTop = chatHistory.scrollHeight;
+    }
+
     function renderHistory() {
         chatHistory.innerHTML = '';
         conversationHistory.forEach(turn => {
@@ -200,19 +333,55 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // Only changes since the last poll are fetched; the scratchpad arrives as appended text.
+    let statusVersion = null;
+    let scratchpadText = '';
+    let agentStatus = '';
+
     function pollStatus() {
-        fetch(`${API_BASE_URL}status`)
+        const url = statusVersion === null ? `${API_BASE_URL}status` : `${API_BASE_URL}status?since=${statusVersion}`;
+        fetch(url)
             .then(response => response.json())
             .then(data => {
-                scratchpadTextarea.value = data.scratchpad;
-                mainPlanTextarea.value = data.main_plan;
-                scratchpadMd.innerHTML = marked.parse(data.scratchpad);
-                mainPlanMd.innerHTML = marked.parse(data.main_plan);
-                agentStatusSpan.textContent = data.agent_status;
+                statusVersion = data.version;
+                if (data.delta) {
+                    const scratchpad = data.logs.scratchpad;
+                    if (scratchpad.reset) {
+                        scratchpadText = scratchpad.text;
+                        scratchpadRenderer.set(scratchpadText);
+                    } else if (scratchpad.text) {
+                        scratchpadText += scratchpad.text;
+                        scratchpadRenderer.append(scratchpad.text);
+                    }
+                    // Drop text the server has moved out of its visible window.
+                    if (scratchpadText.length > scratchpad.length) {
+                        scratchpadText = scratchpadText.slice(scratchpadText.length - scratchpad.length);
+                    }
+                    const excess = scratchpadRenderer.text().length - scratchpad.length;
+                    if (excess > 0) {
+                        scratchpadRenderer.trimStart(excess);
+                    }
+                } else {
+                    scratchpadText = data.scratchpad;
+                    scratchpadRenderer.set(scratchpadText);
+                }
+                if (scratchpadTextarea.value !== scratchpadText) {
+                    scratchpadTextarea.value = scratchpadText;
+                }
+                if (data.main_plan !== undefined) {
+                    mainPlanTextarea.value = data.main_plan;
+                    mainPlanRenderer.set(data.main_plan);
+                }
+                if (data.agent_status !== undefined) {
+                    agentStatus = data.agent_status;
+                }
+                if (data.confirmation_prompt !== undefined) {
+                    confirmationPrompt.textContent = data.confirmation_prompt;
+                }
+                agentStatusSpan.textContent = agentStatus;
                 autoApproveSwitch.checked = data.auto_approve;
 
-                if (data.agent_status === 'PAUSED_FOR_CONFIRMATION') {
-                    confirmationPrompt.textContent = data.confirmation_prompt;
+                if (agentStatus === 'PAUSED_FOR_CONFIRMATION') {
                     confirmationModal.style.display = 'flex';
                 } else {
                     confirmationModal.style.display = 'none';
@@ -223,7 +392,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     stopAgentButton.disabled = true;
                     agentStatusSpan.textContent = "Idle";
                     clearInterval(statusInterval);
-                    if (data.agent_status !== 'PAUSED_FOR_CONFIRMATION') {
+                    if (agentStatus !== 'PAUSED_FOR_CONFIRMATION') {
                         alert("Agent has finished its task.");
                     }
                 }
@@ -246,6 +415,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (errorMessage) {
                 loadingIndicator.style.display = 'flex';
                 const modelMessageElement = appendMessage('model', '');
+                const renderer = createMarkdownRenderer(modelMessageElement, scrollChatToBottom);
                 let fullResponse = '';
 
                 try {
@@ -259,30 +429,14 @@ document.addEventListener('DOMContentLoaded', () => {
                          })
                      });
 
-                     const reader = response.body.getReader();
-                     const decoder = new TextDecoder();
-
-                     while (true) {
-                         const { value, done } = await reader.read();
-                         if (done) break;
-
-                         const rawSse = decoder.decode(value);
-                         const sseMessages = rawSse.split('\\n\\n').filter(Boolean);
-
-                         for (const sseMessage of sseMessages) {
-                             if (sseMessage.startsWith('data:')) {
-                                 const dataStr = sseMessage.substring(5);
-                                 const data = JSON.parse(dataStr);
-                                 if (data.chunk) {
-                                     fullResponse += data.chunk;
-                                     modelMessageElement.innerHTML = marked.parse(fullResponse);
-                                     chatHistory.scrollTop = chatHistory.scrollHeight;
-                                 }
-                             }
-                         }
-                     }
+                    await readSseStream(response, data => {
+                        if (data.chunk) {
+                            fullResponse += data.chunk;
+                            renderer.append(data.chunk);
+                        }
+                    });
                 } catch (e) {
-                    modelMessageElement.innerHTML = "Error fetching response.";
+                    renderer.set("Error fetching response.");
                 } finally {
                     loadingIndicator.style.display = 'none';
                     conversationHistory.push({ role: 'model', parts: [{ "text": fullResponse }] });
@@ -309,13 +463,14 @@ document.addEventListener('DOMContentLoaded', () => {
 
     scratchpadTextarea.addEventListener('input', () => {
         const content = scratchpadTextarea.value;
-        scratchpadMd.innerHTML = marked.parse(content);
+        scratchpadText = content;
+        scratchpadRenderer.set(content);
         updateState('scratchpad', content);
     });
 
     mainPlanTextarea.addEventListener('input', () => {
         const content = mainPlanTextarea.value;
-        mainPlanMd.innerHTML = marked.parse(content);
+        mainPlanRenderer.set(content);
         updateState('main_plan', content);
     });
 
@@ -0,0 +1,81 @@
+# tests/test_checkpoints.py
+
+import os
+import sys
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.checkpoints import CheckpointStore
+
+@pytest.fixture
+def workspace(tmp_path):
+    root = tmp_path / "workspace"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "module.py").write_text("def answer():\n    return 42\n")
+    (root / "README.md").write_text("hello\n")
+    store = CheckpointStore(str(root), str(tmp_path / ".checkpoints"))
+    return root, store
+
+def test_diff_since_reports_changes(workspace):
+    root, store = workspace
+    checkpoint_id = store.checkpoint("start")
+    (root / "pkg" / "module.py").write_text("def answer():\n    return 43\n")
+    (root / "README.md").unlink()
+    (root / "new.txt").write_text("new\n")
+
+    changes = store.diff_since(checkpoint_id)
+    assert changes == {"added": ["new.txt"], "modified": [os.path.join("pkg", "module.py")], "deleted": ["README.md"]}
+    assert "+    return 43" in store.unified_diff(checkpoint_id, os.path.join("pkg", "module.py"))
+
+def test_rollback_restores_tree(workspace):
+    root, store = workspace
+    checkpoint_id = store.checkpoint("start")
+    (root / "pkg" / "module.py").write_text("broken")
+    (root / "README.md").unlink()
+    (root / "scratch").mkdir()
+    (root / "scratch" / "tmp.py").write_text("x = 1\n")
+
+    result = store.rollback(checkpoint_id)
+    assert result == {"restored": 2, "removed": 1}
+    assert (root / "pkg" / "module.py").read_text() == "def answer():\n    return 42\n"
+    assert (root / "README.md").read_text() == "hello\n"
+    assert not (root / "scratch").exists()
+
+def test_rollback_can_be_undone(workspace):
+    root, store = workspace
+    checkpoint_id = store.checkpoint("start")
+    (root / "README.md").write_text("edited\n")
+    store.rollback(checkpoint_id)
+
+    undo_id = store.list_checkpoints()[-1]["id"]
+    store.rollback(undo_id)
+    assert (root / "README.md").read_text() == "edited\n"
+
+def test_auto_checkpoints_are_pruned(workspace):
+    root, store = workspace
+    store.max_auto = 2
+    manual_id = store.checkpoint("manual")
+    for i in range(5):
+        (root / "README.md").write_text(f"version {i}\n")
+        store.checkpoint(f"auto {i}", auto=True)
+
+    ids = [entry["id"] for entry in store.list_checkpoints()]
+    assert ids[0] == manual_id
+    assert len(ids) == 3
+    store.rollback(manual_id)
+    assert (root / "README.md").read_text() == "hello\n"
+
+def test_rollback_to_oldest_auto_checkpoint_at_limit(workspace):
+    root, store = workspace
+    store.max_auto = 2
+    (root / "README.md").write_text("first\n")
+    oldest_id = store.checkpoint("auto 0", auto=True)
+    (root / "README.md").write_text("second\n")
+    store.checkpoint("auto 1", auto=True)
+    (root / "README.md").write_text("third\n")
+
+    store.rollback(oldest_id)
+    assert (root / "README.md").read_text() == "first\n"
+    assert (root / "pkg" / "module.py").read_text() == "def answer():\n    return 42\n"
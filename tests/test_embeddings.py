@@ -0,0 +1,73 @@
+# tests/test_embeddings.py
+
+import os
+import sys
+import threading
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.embeddings import EmbeddingQueue, parity_check, run_off_hub
+
+class FakeBackend:
+    """Embeds text as [length, vowel count] and records batch sizes."""
+
+    def __init__(self, block=None):
+        self.batches = []
+        self.block = block
+        self.entered = threading.Event()
+
+    def encode(self, texts):
+        self.entered.set()
+        if self.block:
+            self.block.wait()
+        self.batches.append(len(texts))
+        return [[float(len(t)), float(sum(t.count(v) for v in "aeiou"))] for t in texts]
+
+def test_queue_returns_results_per_request():
+    embedder = EmbeddingQueue(FakeBackend())
+    assert embedder.encode(["abc", "hello"]) == [[3.0, 1.0], [5.0, 2.0]]
+    embedder.close()
+
+def test_queued_requests_share_a_batch():
+    release = threading.Event()
+    backend = FakeBackend(block=release)
+    embedder = EmbeddingQueue(backend, batch_size=64)
+    first = embedder.submit(["warmup"])  # occupies the worker until released
+    backend.entered.wait(timeout=1)
+    futures = [embedder.submit([f"text {i}"]) for i in range(5)]
+    release.set()
+    assert first.result() == [[6.0, 2.0]]
+    assert [f.result()[0][0] for f in futures] == [6.0] * 5
+    assert backend.batches == [1, 5]
+    embedder.close()
+
+def test_backend_errors_propagate():
+    class Broken:
+        def encode(self, texts):
+            raise RuntimeError("model failed")
+
+    embedder = EmbeddingQueue(Broken())
+    with pytest.raises(RuntimeError):
+        embedder.encode(["x"])
+    embedder.close()
+
+def test_run_off_hub_calls_directly_without_gevent_patching():
+    assert run_off_hub(sorted, [3, 1, 2], reverse=True) == [3, 2, 1]
+
+def test_parity_check_identical_backends_pass():
+    pytest.importorskip("numpy")
+    documents = ["alpha", "banana split", "cucumber salad", "dog", "elephant ear"]
+    result = parity_check(FakeBackend(), FakeBackend(), documents, ["apple", "eel"], k=2)
+    assert result["recall_at_k"] == 1.0
+    assert result["passed"]
+
+def test_parity_check_fails_when_candidate_fell_back():
+    pytest.importorskip("numpy")
+    reference, candidate = FakeBackend(), FakeBackend()
+    reference.name = candidate.name = "float"
+    documents = ["alpha", "banana split", "cucumber salad"]
+    result = parity_check(reference, candidate, documents, ["apple"], k=2, expected_candidate="onnx-int8")
+    assert result["reference"] == result["candidate"] == "float"
+    assert not result["passed"]
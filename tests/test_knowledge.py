@@ -0,0 +1,68 @@
+# tests/test_knowledge.py
+
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.knowledge import KnowledgeStore
+
+TOPICS = ["docker", "pytest", "flask", "git"]
+
+def fake_embed(texts):
+    """One dimension per known topic word."""
+    return [[float(topic in text.lower()) + 0.01 for topic in TOPICS] for text in texts]
+
+def make_store(tmp_path, **kwargs):
+    return KnowledgeStore(str(tmp_path / "knowledge.json"), embed=fake_embed, **kwargs)
+
+def test_near_duplicates_are_merged(tmp_path):
+    store = make_store(tmp_path)
+    assert store.add("Docker builds need the socket mounted.") == "added"
+    assert store.add("Mount the Docker socket before building.") == "merged"
+    assert store.add("Run pytest with -x to stop early.") == "added"
+    assert len(store) == 2
+
+def test_relevant_returns_top_k_for_goal(tmp_path):
+    store = make_store(tmp_path)
+    store.add("Docker builds need the socket mounted.")
+    store.add("Run pytest with -x to stop early.")
+    store.add("Flask routes return jsonify responses.")
+
+    prompt = store.format_relevant("Fix the failing pytest suite", k=1)
+    assert "pytest" in prompt
+    assert "Docker" not in prompt
+
+def test_keyed_records_are_replaced(tmp_path):
+    store = make_store(tmp_path)
+    store.add("Blueprint v1 for git tooling", kind="blueprint", key="blueprint:app")
+    assert store.add("Blueprint v2 for flask app", kind="blueprint", key="blueprint:app") == "replaced"
+    assert len(store) == 1
+
+def test_budget_evicts_least_useful(tmp_path):
+    store = make_store(tmp_path, max_chars=80)
+    store.add("Docker builds need the socket mounted.")
+    store.relevant("docker")
+    store.add("Run pytest with -x to stop early.")
+    store.add("Flask routes return jsonify responses.")
+
+    reloaded = make_store(tmp_path)
+    texts = [r["text"] for r in reloaded.relevant("docker flask pytest git", k=10)]
+    assert "Docker builds need the socket mounted." in texts
+    assert sum(len(t) for t in texts) <= 80
+
+def test_budget_holds_when_merge_lengthens_a_record(tmp_path):
+    store = make_store(tmp_path, max_chars=80)
+    store.add("Docker builds need the socket mounted.")
+    store.add("Run pytest with -x to stop early.")
+    assert store.add("Mount the Docker socket before building, or docker build fails.") == "merged"
+
+    texts = [r["text"] for r in make_store(tmp_path).relevant("docker flask pytest git", k=10)]
+    assert texts == ["Mount the Docker socket before building, or docker build fails."]
+
+def test_legacy_markdown_is_imported(tmp_path):
+    legacy = tmp_path / "knowledge_base.md"
+    legacy.write_text("# Agent Knowledge Base\n\n---\n**Learning recorded at 2024-01-01 10:00:00:**\nUse git status first.\n")
+    store = make_store(tmp_path, legacy_markdown_path=str(legacy))
+    assert [r["text"] for r in store.relevant("git")] == ["Use git status first."]
@@ -0,0 +1,76 @@
+# tests/test_patching.py
+
+import os
+import sys
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.patching import PatchError, apply_search_replace, apply_line_range, parse_unified_diff, apply_hunks, summarize_change
+
+SOURCE = "def add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b\n"
+
+def test_search_replace_requires_unique_match():
+    assert "a * b" in apply_search_replace(SOURCE, "return a + b", "return a * b")
+    with pytest.raises(PatchError):
+        apply_search_replace(SOURCE, "return", "yield")
+    with pytest.raises(PatchError):
+        apply_search_replace(SOURCE, "missing", "x")
+
+def test_line_range_replace_and_insert():
+    replaced = apply_line_range(SOURCE, 2, 2, "    return b + a", expected="    return a + b")
+    assert replaced.splitlines()[1] == "    return b + a"
+    inserted = apply_line_range(SOURCE, 1, 0, "import math")
+    assert inserted.startswith("import math\ndef add")
+    with pytest.raises(PatchError):
+        apply_line_range(SOURCE, 2, 2, "x", expected="something else")
+    with pytest.raises(PatchError):
+        apply_line_range(SOURCE, 4, 9, "x")
+
+def test_multi_file_unified_diff():
+    patch = (
+        "--- a/math_ops.py\n"
+        "+++ b/math_ops.py\n"
+        "@@ -4,2 +4,2 @@\n"
+        " def sub(a, b):\n"
+        "-    return a - b\n"
+        "+    return a - b - 0\n"
+        "--- /dev/null\n"
+        "+++ b/new_module.py\n"
+        "@@ -0,0 +1,1 @@\n"
+        "+VALUE = 1\n"
+    )
+    files = parse_unified_diff(patch)
+    assert [(f["old_path"], f["new_path"]) for f in files] == [("math_ops.py", "math_ops.py"), (None, "new_module.py")]
+    assert apply_hunks(SOURCE, files[0]["hunks"]).endswith("return a - b - 0\n")
+    assert apply_hunks("", files[1]["hunks"]) == "VALUE = 1\n"
+
+def test_hunk_with_shifted_context_still_applies():
+    patch = "--- a/m.py\n+++ b/m.py\n@@ -1,2 +1,2 @@\n def sub(a, b):\n-    return a - b\n+    return b - a\n"
+    hunks = parse_unified_diff(patch)[0]["hunks"]
+    assert "return b - a" in apply_hunks(SOURCE, hunks)
+
+def test_hunk_with_stale_context_is_rejected():
+    patch = "--- a/m.py\n+++ b/m.py\n@@ -1,2 +1,2 @@\n def mul(a, b):\n-    return a * b\n+    return b * a\n"
+    with pytest.raises(PatchError):
+        apply_hunks(SOURCE, parse_unified_diff(patch)[0]["hunks"])
+
+def test_summary_is_compact():
+    summary = summarize_change("m.py", SOURCE, SOURCE.replace("a + b", "a + b + 1"))
+    assert summary.splitlines()[0] == "m.py: +1 -1"
+
+def test_hunk_longer_than_its_header_is_rejected():
+    patch = "--- a/x.py\n+++ b/x.py\n@@ -1,1 +1,1 @@\n-a\n+A\n+A2\n b\n"
+    with pytest.raises(PatchError, match="more lines"):
+        parse_unified_diff(patch)
+
+def test_hunk_shorter_than_its_header_is_rejected():
+    patch = (
+        "--- a/x.py\n+++ b/x.py\n@@ -1,3 +1,3 @@\n-a\n+A\n b\n"
+        "--- a/y.py\n+++ b/y.py\n@@ -1 +1 @@\n-c\n+C\n"
+    )
+    with pytest.raises(PatchError, match="fewer lines"):
+        parse_unified_diff(patch)
+    with pytest.raises(PatchError, match="fewer lines"):
+        parse_unified_diff("--- a/x.py\n+++ b/x.py\n@@ -1,3 +1,3 @@\n-a\n+A\n b\n")
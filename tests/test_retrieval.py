@@ -0,0 +1,70 @@
+# tests/test_retrieval.py
+
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.retrieval import ContextRetriever, select_snippets
+
+def fake_search(query, n_results):
+    return [
+        {"filepath": "workspace/app.py", "document": "def handler():\n    return 42"},
+        {"filepath": "workspace/util.py", "document": "def helper():\n    pass"},
+        {"filepath": "workspace/big.py", "document": "x = 1\n" * 500},
+    ][:n_results]
+
+def test_select_snippets_respects_budget_and_history():
+    snippets = fake_search("q", 3)
+    selected, skipped = select_snippets(snippets, "def helper():\n    pass", token_budget=50)
+    assert [s["filepath"] for s in selected] == ["workspace/app.py"]
+    assert skipped == 1
+
+def test_retriever_injects_context_and_tracks_savings():
+    retriever = ContextRetriever(search=fake_search, refresh=lambda: None, token_budget=100)
+    retriever.refresh_index()
+    history = [{"role": "user", "parts": [{"text": "goal"}]}]
+    context = retriever.collect(retriever.submit("plan"), history)
+    assert "workspace/app.py" in context
+    assert "workspace/util.py" in context
+    assert retriever.stats["estimated_reads_saved"] == 2
+
+    retriever.record_tool_call("read_file", {"filepath": "workspace/app.py"})
+    assert retriever.stats["exploratory_tool_calls"] == 1
+    assert retriever.stats["estimated_reads_saved"] == 1
+    retriever.shutdown()
+
+def test_retrieval_failure_yields_no_context():
+    def broken_search(query, n_results):
+        raise ConnectionError("chroma unavailable")
+
+    retriever = ContextRetriever(search=broken_search, refresh=lambda: None)
+    retriever.refresh_index()
+    assert retriever.collect(retriever.submit("plan"), []) == ""
+    assert retriever.stats["retrieval_failures"] == 1
+    retriever.shutdown()
+
+def test_no_context_until_index_refresh_succeeds():
+    def broken_refresh():
+        raise RuntimeError("embedding model unavailable")
+
+    retriever = ContextRetriever(search=fake_search, refresh=broken_refresh)
+    retriever.refresh_index()
+    assert retriever.collect(retriever.submit("plan"), []) == ""
+    assert retriever.stats["index_refresh_failures"] == 1
+    retriever.shutdown()
+
+def test_refresh_runs_before_later_searches():
+    calls = []
+    retriever = ContextRetriever(
+        search=lambda query, n: calls.append("search") or fake_search(query, n),
+        refresh=lambda: calls.append("refresh"),
+    )
+    retriever.refresh_index()
+    retriever.collect(retriever.submit("plan"), [])
+    # After an edit the same query is searched again instead of served from cache.
+    retriever.refresh_index()
+    retriever.collect(retriever.submit("plan"), [])
+    assert calls == ["refresh", "search", "refresh", "search"]
+    retriever.shutdown()
@@ -0,0 +1,70 @@
+# tests/test_routing.py
+
+import os
+import sys
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.routing import ModelRouter, load_routing_rules, DEFAULT_ROUTING_RULES
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def generate_content(self, *args, **kwargs):
+        self.calls += 1
+        return self.name
+
+def make_router(**rules):
+    fast, strong = FakeModel("fast"), FakeModel("strong")
+    return ModelRouter(fast, strong, dict(DEFAULT_ROUTING_RULES, **rules)), fast, strong
+
+def test_planning_turn_then_fast_model():
+    router, fast, strong = make_router()
+    assert router.generate("prompt") == "strong"
+    assert router.generate("prompt") == "fast"
+    assert router.stats["turns"] == {"fast": 1, "strong": 1}
+
+def test_repeated_test_failures_escalate():
+    router, _, _ = make_router(planning_turns=0, test_failures=2, escalation_turns=2)
+    router.observe_tool_result("run_tests", "=== 1 failed, 3 passed in 0.1s ===")
+    assert router.select()[1] == "fast"
+    router.observe_tool_result("run_tests", "=== 2 failed, 2 passed in 0.1s ===")
+    assert [router.select()[1] for _ in range(3)] == ["strong", "strong", "fast"]
+    assert router.stats["escalation_reasons"] == {"repeated test failures": 1}
+
+def test_passing_tests_reset_failure_streak():
+    router, _, _ = make_router(planning_turns=0, test_failures=2)
+    router.observe_tool_result("run_tests", "1 failed")
+    router.observe_tool_result("run_tests", "4 passed in 0.1s")
+    router.observe_tool_result("run_tests", "1 failed")
+    assert router.select()[1] == "fast"
+
+def test_text_response_and_malformed_calls_escalate():
+    router, _, _ = make_router(planning_turns=0, escalation_turns=1)
+    router.observe_text_response()
+    assert router.select()[1:] == ("strong", "text instead of tool call")
+    router.observe_malformed_tool_call()
+    assert router.select()[1:] == ("strong", "malformed tool call")
+    assert router.select()[1] == "fast"
+    assert router.stats["escalations"] == 2
+
+def test_denied_confirmation_requests_planning():
+    router, _, _ = make_router(planning_turns=1)
+    router.select()
+    router.request_planning()
+    assert router.select()[1:] == ("strong", "planning step")
+
+def test_single_model_never_escalates():
+    model = FakeModel("only")
+    router = ModelRouter(model, model)
+    router.observe_text_response()
+    assert router.select()[2] == "single model"
+    assert router.stats["escalations"] == 0
+
+def test_unknown_routing_rule_rejected():
+    with pytest.raises(ValueError):
+        load_routing_rules({"bogus": 1})
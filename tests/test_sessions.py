@@ -0,0 +1,68 @@
+# tests/test_sessions.py
+
+import os
+import sys
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.sessions import SessionStore, SessionVersionConflict
+
+def make_turn(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+def test_append_bumps_version():
+    store = SessionStore()
+    session = store.create()
+    version = store.append(session.session_id, [make_turn("user", "hi"), make_turn("model", "hello")], 0)
+    assert version == 1
+    assert len(store.get(session.session_id).history) == 2
+
+def test_stale_version_is_rejected():
+    store = SessionStore()
+    session = store.create()
+    store.append(session.session_id, [make_turn("user", "hi")], 0)
+    with pytest.raises(SessionVersionConflict):
+        store.append(session.session_id, [make_turn("user", "again")], 0)
+
+def test_lru_eviction_by_count():
+    store = SessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    store.get(first.session_id)  # first is now most recently used
+    store.create()
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is not None
+
+def test_eviction_by_size():
+    store = SessionStore(max_bytes=100)
+    first = store.create([make_turn("user", "x" * 80)])
+    store.create([make_turn("user", "y" * 80)])
+    assert store.get(first.session_id) is None
+    assert store.total_bytes <= 100
+
+def test_evicted_sessions_reload_from_disk(tmp_path):
+    store = SessionStore(max_sessions=1, persist_dir=str(tmp_path))
+    first = store.create([make_turn("user", "remember me")])
+    store.create()
+    assert len(store) == 1
+
+    reloaded = store.get(first.session_id)
+    assert reloaded.history == [make_turn("user", "remember me")]
+    assert reloaded.version == first.version
+
+def test_replace_drops_cached_live_chat():
+    store = SessionStore()
+    session = store.create()
+    session.chat, session.model_name = object(), "gemini-1.5-pro"
+    replaced = store.replace(session.session_id, [make_turn("user", "resynced")])
+    assert replaced.history == [make_turn("user", "resynced")]
+    assert replaced.chat is None and replaced.model_name is None
+
+def test_append_while_holding_session_lock():
+    # Chat streams hold the session lock until their turn is stored.
+    store = SessionStore()
+    session = store.create()
+    with session.lock:
+        assert store.append(session.session_id, [make_turn("user", "hi")], 0) == 1
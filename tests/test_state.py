@@ -0,0 +1,82 @@
+# tests/test_state.py
+
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.state import AgentState, AppendLog
+
+def make_state(window_chars=1000, archive_path=None):
+    return AgentState(
+        fields={"status": "stopped", "main_plan": ""},
+        logs={"scratchpad": AppendLog(window_chars, archive_path=archive_path)},
+    )
+
+def test_appends_join_like_concatenation():
+    state = make_state()
+    state.set("scratchpad", "start")
+    state.append("scratchpad", "step one")
+    state.append("scratchpad", "step two")
+    assert state["scratchpad"] == "start\nstep one\nstep two"
+
+def test_changes_since_returns_only_new_content():
+    state = make_state()
+    state.set("scratchpad", "start")
+    version = state.set("main_plan", "plan")
+    state.append("scratchpad", "step one")
+    state.set("status", "running")
+
+    changes = state.changes_since(version)
+    assert changes["fields"] == {"status": "running"}
+    assert changes["logs"]["scratchpad"] == {"reset": False, "text": "\nstep one", "length": len("start\nstep one")}
+    assert changes["version"] == state.version
+
+def test_manual_reset_forces_full_refresh():
+    state = make_state()
+    version = state.set("scratchpad", "start")
+    state.set("scratchpad", "edited by hand")
+    assert state.changes_since(version)["logs"]["scratchpad"] == {"reset": True, "text": "edited by hand", "length": len("edited by hand")}
+
+def test_window_is_bounded_and_old_segments_archived(tmp_path):
+    archive = tmp_path / "archive.md"
+    state = make_state(window_chars=50, archive_path=str(archive))
+    state.set("scratchpad", "start")
+    for i in range(20):
+        state.append("scratchpad", f"segment {i}")
+
+    visible = state["scratchpad"]
+    assert len(visible) <= 50
+    assert visible.endswith("segment 19")
+    assert "segment 0\n" in archive.read_text()
+    assert state.changes_since(1)["logs"]["scratchpad"]["reset"]
+
+def test_snapshot_is_consistent_copy():
+    state = make_state()
+    state.set("main_plan", "plan")
+    snapshot = state.snapshot()
+    state.set("main_plan", "new plan")
+    assert snapshot["main_plan"] == "plan"
+    assert snapshot["version"] == 1
+
+def test_reader_following_deltas_stays_within_window():
+    state = make_state(window_chars=100)
+    version = state.set("scratchpad", "start")
+    copy = "start"
+    for i in range(200):
+        state.append("scratchpad", f"segment {i}")
+        changes = state.changes_since(version)
+        log = changes["logs"]["scratchpad"]
+        copy = log["text"] if log["reset"] else copy + log["text"]
+        copy = copy[len(copy) - log["length"]:]
+        version = changes["version"]
+    assert copy == state["scratchpad"]
+    assert len(copy) <= 100
+
+def test_reset_is_capped_to_window(tmp_path):
+    archive = tmp_path / "archive.md"
+    state = make_state(window_chars=10, archive_path=str(archive))
+    state.set("scratchpad", "0123456789abcdef")
+    assert state["scratchpad"] == "6789abcdef"
+    assert archive.read_text().startswith("012345")
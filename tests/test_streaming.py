@@ -0,0 +1,31 @@
+# tests/test_streaming.py
+
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.streaming import StreamRegistry, buffered_stream
+
+def test_buffered_stream_relays_all_events():
+    registry = StreamRegistry()
+    events = (f"data: {i}\n\n" for i in range(100))
+    output = "".join(buffered_stream(events, registry, max_buffered=4))
+    assert output == "".join(f"data: {i}\n\n" for i in range(100))
+    assert registry.active == 0
+
+def test_closing_stream_releases_producer():
+    registry = StreamRegistry()
+    stream = buffered_stream((str(i) for i in range(10000)), registry, max_buffered=2)
+    next(stream)
+    assert registry.active == 1
+    stream.close()
+    assert registry.active == 0
+    assert registry.drain(timeout=1)
+
+def test_no_new_streams_after_drain():
+    registry = StreamRegistry()
+    assert registry.drain(timeout=1)
+    output = "".join(buffered_stream(iter(["data: hi\n\n"]), registry))
+    assert "shutting down" in output
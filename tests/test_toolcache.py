@@ -0,0 +1,71 @@
+# tests/test_toolcache.py
+
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.toolcache import ToolResultCache, touched_paths
+
+ROOT = "/project"
+
+def make_cache():
+    cache = ToolResultCache(ROOT)
+    cache.record("read_file", {"filepath": "workspace/src/app.py"}, "print('hi')")
+    cache.record("list_files", {"path": "workspace/docs"}, '{"index.md": null}')
+    return cache
+
+def test_repeated_read_is_a_hit():
+    cache = make_cache()
+    response = cache.lookup("read_file", {"filepath": "./workspace/src/app.py"})
+    assert response.startswith("Unchanged")
+    assert "read_file(filepath='./workspace/src/app.py')" not in response
+    assert "read_file(filepath='workspace/src/app.py')" in response
+    assert cache.stats["hits"] == 1
+    assert cache.lookup("read_file", {"filepath": "workspace/src/other.py"}) is None
+    assert cache.stats["misses"] == 1
+
+def test_write_invalidates_file_and_containing_listings():
+    cache = make_cache()
+    cache.record("list_files", {"path": "workspace"}, "{}")
+    cache.record("write_file", {"filepath": "workspace/src/app.py", "content": ""}, "File written successfully.")
+    assert cache.lookup("read_file", {"filepath": "workspace/src/app.py"}) is None
+    assert cache.lookup("list_files", {"path": "workspace"}) is None
+    # Unrelated paths stay cached.
+    assert cache.lookup("list_files", {"path": "workspace/docs"}) is not None
+
+def test_rename_of_directory_invalidates_entries_inside_it():
+    cache = make_cache()
+    cache.record("rename_file", {"old_filepath": "workspace/src", "new_filepath": "workspace/lib"}, "ok")
+    assert cache.lookup("read_file", {"filepath": "workspace/src/app.py"}) is None
+    assert cache.lookup("list_files", {"path": "workspace/docs"}) is not None
+
+def test_patch_invalidates_its_files():
+    cache = make_cache()
+    patch = "--- a/workspace/src/app.py\n+++ b/workspace/src/app.py\n@@ -1 +1 @@\n-print('hi')\n+print('bye')\n"
+    cache.record("apply_patch", {"patch": patch}, "workspace/src/app.py: +1 -1")
+    assert cache.lookup("read_file", {"filepath": "workspace/src/app.py"}) is None
+
+def test_sandbox_and_git_runs_invalidate_broadly():
+    cache = make_cache()
+    cache.record("read_file", {"filepath": "README.md"}, "# Readme")
+    cache.record("run_tests", {"test_directory": "workspace/tests"}, "1 passed")
+    assert cache.lookup("read_file", {"filepath": "workspace/src/app.py"}) is None
+    assert cache.lookup("read_file", {"filepath": "README.md"}) is not None
+    cache.record("execute_git_command", {"command": "checkout ."}, "")
+    assert cache.lookup("read_file", {"filepath": "README.md"}) is None
+
+def test_errors_and_failed_calls_are_not_cached():
+    cache = ToolResultCache(ROOT)
+    cache.record("generate_project_blueprint", {"target_directory": "workspace"}, "Error generating project blueprint: quota")
+    assert cache.lookup("generate_project_blueprint", {"target_directory": "workspace"}) is None
+    cache.record("read_file", {"filepath": "workspace/a.py"}, None)
+    assert cache.lookup("read_file", {"filepath": "workspace/a.py"}) is None
+    cache.record("read_file", {"filepath": "workspace/missing.py"}, "Error: [Errno 2] No such file or directory")
+    assert cache.lookup("read_file", {"filepath": "workspace/missing.py"}) is None
+
+def test_touched_paths():
+    assert touched_paths("edit_files", {"edits": [{"filepath": "a.py"}, {"filepath": "b.py"}]}) == ["a.py", "b.py"]
+    assert touched_paths("web_search", {"query": "x"}) == []
+    assert touched_paths("execute_git_command", {"command": "status"}) is None
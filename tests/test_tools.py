@@ -7,7 +7,7 @@ import pytest
 # Add the backend directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from backend.tools import read_file, write_file, list_files, create_directory, delete_file, rename_file
+from backend.tools import read_file, write_file, edit_files, apply_patch, list_files, create_directory, delete_file, rename_file, auto_checkpoint
 
 @pytest.fixture
 def setup_teardown():
@@ -51,6 +51,11 @@ def test_list_files(setup_teardown):
     file_list = list_files(test_dir)
     assert "test_file.txt" in file_list
 
+def test_read_and_list_failures_are_marked(setup_teardown):
+    test_dir, test_file, _ = setup_teardown
+    assert read_file(test_file).startswith("Error:")
+    assert list_files(test_dir).startswith("Error:")
+
 def test_rename_file(setup_teardown):
     test_dir, test_file, renamed_file = setup_teardown
     create_directory(test_dir)
@@ -69,3 +74,35 @@ def test_delete_file(setup_teardown):
     delete_result = delete_file(test_file)
     assert "deleted successfully" in delete_result
     assert not os.path.exists(test_file)
+
+def test_edit_files(setup_teardown):
+    test_dir, test_file, _ = setup_teardown
+    create_directory(test_dir)
+    write_file(test_file, "line one\nline two\nline three\n")
+
+    result = edit_files([
+        {"filepath": test_file, "search": "line two", "replace": "line 2"},
+        {"filepath": test_file, "start_line": 3, "end_line": 3, "content": "line 3"},
+    ])
+    assert "+2 -2" in result
+    assert read_file(test_file) == "line one\nline 2\nline 3\n"
+
+    failed = edit_files([{"filepath": test_file, "search": "missing", "replace": "x"}])
+    assert "No files were changed" in failed
+    assert read_file(test_file) == "line one\nline 2\nline 3\n"
+
+def test_apply_patch_does_not_overwrite_on_creation(setup_teardown):
+    test_dir, test_file, _ = setup_teardown
+    create_directory(test_dir)
+    write_file(test_file, "existing\n")
+
+    result = apply_patch(f"--- /dev/null\n+++ b/{test_file}\n@@ -0,0 +1 @@\n+new\n")
+    assert "already exists" in result
+    assert read_file(test_file) == "existing\n"
+
+def test_auto_checkpoint_skips_paths_outside_workspace(setup_teardown):
+    _, test_file, renamed_file = setup_teardown
+    note = auto_checkpoint("rename_file", {"old_filepath": "workspace/a.txt", "new_filepath": renamed_file})
+    assert "no checkpoint" in note and renamed_file in note
+    patch = f"--- a/{test_file}\n+++ b/{test_file}\n@@ -1 +1 @@\n-a\n+b\n"
+    assert test_file in auto_checkpoint("apply_patch", {"patch": patch})
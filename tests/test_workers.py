@@ -0,0 +1,79 @@
+# tests/test_workers.py
+
+import os
+import sys
+import pytest
+
+# Add the backend directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from backend.workers import WorkerPool, WorkerTimeout, ModuleTracker, module_imports
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    # Make sure the change is visible even on file systems with coarse timestamps.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000))
+
+def test_module_imports_resolves_relative_imports(tmp_path):
+    source = tmp_path / "service.py"
+    source.write_text("import os\nfrom . import models\nfrom .utils import helper\nfrom pkg.sub import thing\n")
+    assert module_imports(str(source), "app.service") == {
+        "os", "app", "app.models", "app.utils", "app.utils.helper", "pkg.sub", "pkg.sub.thing",
+    }
+
+def test_tracker_purges_changed_modules_and_their_importers(tmp_path, monkeypatch):
+    write(tmp_path / "base.py", "VALUE = 1\n")
+    write(tmp_path / "user.py", "from base import VALUE\n")
+    write(tmp_path / "other.py", "X = 2\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ("base", "user", "other"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    import user, other  # noqa: F401
+
+    tracker = ModuleTracker(str(tmp_path))
+    tracker.track()
+    assert tracker.purge_changed() == set()
+
+    write(tmp_path / "base.py", "VALUE = 2\n")
+    assert tracker.purge_changed() == {"base", "user"}
+    assert "other" in sys.modules and "user" not in sys.modules
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = WorkerPool(project_root, str(tmp_path), size=1)
+    yield pool
+    pool.shutdown()
+
+def test_warm_worker_reloads_changed_workspace_code(tmp_path, pool):
+    write(tmp_path / "calc.py", "def add(a, b):\n    return a + b\n")
+    write(tmp_path / "tests" / "test_calc.py",
+          "import os, sys\nsys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))\n"
+          "from calc import add\n\ndef test_add():\n    assert add(2, 2) == 4\n")
+
+    first = pool.run({"kind": "pytest", "path": str(tmp_path / "tests")}, timeout=60)
+    assert first["cold"] and "1 passed" in first["stdout"]
+
+    write(tmp_path / "calc.py", "def add(a, b):\n    return a - b\n")
+    second = pool.run({"kind": "pytest", "path": str(tmp_path / "tests")}, timeout=60)
+    assert not second["cold"] and "1 failed" in second["stdout"]
+    assert pool.speedup() is not None
+    assert "warm worker" in pool.describe(second["seconds"], second["cold"])
+
+def test_debug_job_reads_commands(tmp_path, pool):
+    write(tmp_path / "script.py", "x = 1\ny = x + 1\nprint('y is', y)\n")
+    result = pool.run({"kind": "pdb", "path": str(tmp_path / "script.py"), "commands": ["n", "p x", "c"]}, timeout=30)
+    assert "-> y = x + 1" in result["stdout"]
+    assert "y is 2" in result["stdout"]
+
+def test_timed_out_worker_is_recycled(tmp_path, pool):
+    write(tmp_path / "tests" / "test_slow.py", "import time\n\ndef test_slow():\n    time.sleep(30)\n")
+    with pytest.raises(WorkerTimeout):
+        pool.run({"kind": "pytest", "path": str(tmp_path / "tests")}, timeout=2)
+    assert pool.stats["recycle_reasons"] == {"timeout": 1}
+
+    write(tmp_path / "tests" / "test_slow.py", "def test_fast():\n    pass\n")
+    result = pool.run({"kind": "pytest", "path": str(tmp_path / "tests")}, timeout=60)
+    assert result["cold"] and "1 passed" in result["stdout"]